@@ -0,0 +1,13 @@
+@echo off
+TITLE Meesha Inbox Daemon
+ECHO Starting Meesha Inbox Daemon...
+ECHO Reports dropped into the inbox folder are summarised automatically.
+ECHO Press Ctrl+C to stop.
+
+:: Navigate to the script's directory
+cd /d "%~dp0"
+
+:: Change these two folders to match the LIS export location
+python inbox_daemon.py --inbox "%~dp0inbox" --outbox "%~dp0outbox"
+
+PAUSE
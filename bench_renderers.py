@@ -0,0 +1,168 @@
+"""
+Meesha Renderer Benchmark
+Compares the two summary engines on the same synthetic reports:
+
+  wkhtmltopdf : HTML_TEMPLATE -> pdfkit -> temp file -> PdfWriter
+  native      : summary_pdf draws the page -> bytes -> PdfWriter
+
+Extraction runs once per report up front, so only render + merge are timed.
+Reports latency (render, render+merge) and byte size (summary page, merged file).
+
+--check-layout renders the native page for the longest test names in the CSV
+and a padded patient name, reads it back with pdfplumber, and reports any text
+that runs across a column edge.
+
+Usage:
+    python bench_renderers.py --reports 10 --repeats 5
+    python bench_renderers.py --check-layout
+"""
+import os
+import io
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+from report_core import (
+    SCRIPT_DIR, CSV_DB_FILENAME, SUMMARY_ENGINES,
+    get_wkhtmltopdf_config, load_reference_db, load_branding, extract_comprehensive_data,
+    build_summary_context, render_summary_html, render_summary_pdf, render_summary_native, merge_report,
+)
+from loadtest import make_synthetic_report, percentile
+
+MM_TO_PT = 72 / 25.4
+
+def _render(engine, context, work_dir, config):
+    """Return (summary to merge, summary size in bytes)."""
+    if engine == "native":
+        data = render_summary_native(context)
+        return io.BytesIO(data), len(data)
+    path = os.path.join(work_dir, "bench_summary.pdf")
+    render_summary_pdf(render_summary_html(context), path, config)
+    return path, os.path.getsize(path)
+
+def bench(reports=10, repeats=5, pages=1, csv_path=None, seed=7):
+    csv_path = csv_path or os.path.join(SCRIPT_DIR, CSV_DB_FILENAME)
+    df = load_reference_db(csv_path)
+    if df is None: raise RuntimeError(f"Could not load {csv_path}")
+    config = get_wkhtmltopdf_config()
+    engines = [e for e in SUMMARY_ENGINES if e != "wkhtmltopdf" or config]
+    logo_b64, footer_qr_b64 = load_branding()
+
+    work_dir = tempfile.mkdtemp(prefix="meesha_bench_")
+    try:
+        rng = random.Random(seed)
+        cases = []
+        for i in range(reports):
+            pdf_path = make_synthetic_report(os.path.join(work_dir, f"report_{i:05d}.pdf"), i, df, rng, pages)
+            info, full_results = extract_comprehensive_data(pdf_path, csv_path)
+            cases.append((pdf_path, build_summary_context(info, full_results, logo_b64, footer_qr_b64)))
+
+        results = {}
+        for engine in engines:
+            render_s, total_s, summary_bytes, final_bytes = [], [], [], []
+            for _ in range(repeats):
+                for pdf_path, context in cases:
+                    t0 = time.perf_counter()
+                    summary, size = _render(engine, context, work_dir, config)
+                    t1 = time.perf_counter()
+                    out = io.BytesIO()
+                    merge_report(summary, pdf_path, out)
+                    t2 = time.perf_counter()
+                    render_s.append(t1 - t0)
+                    total_s.append(t2 - t0)
+                    summary_bytes.append(size)
+                    final_bytes.append(out.getbuffer().nbytes)
+            results[engine] = {
+                "render_p50_s": percentile(render_s, 50),
+                "render_p95_s": percentile(render_s, 95),
+                "render_merge_p50_s": percentile(total_s, 50),
+                "render_merge_p95_s": percentile(total_s, 95),
+                "summary_kb_avg": sum(summary_bytes) / len(summary_bytes) / 1024,
+                "final_kb_avg": sum(final_bytes) / len(final_bytes) / 1024,
+            }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return {"reports": reports, "repeats": repeats, "pages": pages,
+            "skipped": [e for e in SUMMARY_ENGINES if e not in engines], "engines": results}
+
+def _crossings(words, spans, label):
+    """Words that start in one column span and end past the start of the next."""
+    found = []
+    for (_, end), (next_start, _) in zip(spans, spans[1:]):
+        for w in words:
+            if w["x0"] < end * MM_TO_PT and w["x1"] > next_start * MM_TO_PT:
+                found.append(f"{label}: '{w['text']}' crosses {end:.1f} mm")
+    return found
+
+def check_layout(csv_path=None):
+    """Render a worst-case native summary and return text that overflows its column."""
+    import pdfplumber
+    from summary_pdf import MARGIN, PATIENT_COL_W, TABLE_WIDTHS
+
+    csv_path = csv_path or os.path.join(SCRIPT_DIR, CSV_DB_FILENAME)
+    df = load_reference_db(csv_path)
+    if df is None: raise RuntimeError(f"Could not load {csv_path}")
+    names = sorted(df["testname"].astype(str).str.strip().unique(), key=len)[-8:]
+    info = {
+        # What the name regex captures from a padded layout line
+        "patient_name": "Mr. RAUNAK KUMAR SHARMA                          Age",
+        "age_gender": "34 Y / Male",
+        "treatment_id": "LT000001234567",
+        "doctor": "Dr. PRIYANKA VENKATARAMAN MBBS MD PATHOLOGY",
+        "date": "01/01/2024",
+    }
+    results = [{"name": n, "value": 12345.67, "range": "0.5 - 10000", "status": s, "css_class": ""}
+               for n, s in zip(names, ["Normal", "High", "Crit Low"] * 3)]
+    context = build_summary_context(info, results)
+
+    with pdfplumber.open(io.BytesIO(render_summary_native(context))) as pdf:
+        words = [w for page in pdf.pages for w in page.extract_words()]
+    tops = {w["text"]: w["top"] for w in reversed(words)}
+    in_band = lambda lo, hi: [w for w in words if tops[lo] <= w["top"] < tops[hi]]
+
+    patient_spans = [(MARGIN + 4 + i * PATIENT_COL_W, MARGIN + 4 + i * PATIENT_COL_W + PATIENT_COL_W - 3)
+                     for i in range(4)]
+    x, table_spans = MARGIN, []
+    for w in TABLE_WIDTHS:
+        table_spans.append((x + 2.5, x + w - 0.5))
+        x += w
+    return (_crossings(in_band("PATIENT", "HEALTH"), patient_spans, "patient box")
+            + _crossings([w for w in words if w["top"] > tops["ANALYSIS"]
+                          and w["top"] < tops["Mahalaxmi"]], table_spans, "results table"))
+
+def print_bench(b):
+    print(f"\n{b['reports']} reports x {b['repeats']} repeats, pages={b['pages']}")
+    if b["skipped"]: print(f"  skipped (not installed): {', '.join(b['skipped'])}")
+    print(f"\n  {'engine':<12}{'render p50':>11}{'p95':>8}{'+merge p50':>12}{'p95':>8}{'summary KB':>12}{'final KB':>10}")
+    for name, r in b["engines"].items():
+        print(f"  {name:<12}{r['render_p50_s']:>11.3f}{r['render_p95_s']:>8.3f}"
+              f"{r['render_merge_p50_s']:>12.3f}{r['render_merge_p95_s']:>8.3f}"
+              f"{r['summary_kb_avg']:>12.1f}{r['final_kb_avg']:>10.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark wkhtmltopdf vs native summary rendering.")
+    parser.add_argument("--reports", type=int, default=10, help="Distinct synthetic reports")
+    parser.add_argument("--repeats", type=int, default=5, help="Renders per report per engine")
+    parser.add_argument("--pages", type=int, default=1, help="Pages per synthetic report")
+    parser.add_argument("--csv", default=None, help=f"Reference ranges (default: {CSV_DB_FILENAME})")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", default=None, help="Also write the results to this file")
+    parser.add_argument("--check-layout", action="store_true", help="Check the native page for text overflow instead")
+    args = parser.parse_args()
+
+    if args.check_layout:
+        problems = check_layout(args.csv)
+        print("\n".join(problems) or "Native layout OK: no text crosses a column edge")
+        return 1 if problems else 0
+
+    b = bench(args.reports, args.repeats, args.pages, args.csv, args.seed)
+    print_bench(b)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(b, f, indent=2)
+
+if __name__ == "__main__":
+    raise SystemExit(main())
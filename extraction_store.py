@@ -0,0 +1,114 @@
+"""
+Raw extraction archive.
+One JSON record per report, keyed by report_hash, keeps what was read from
+the PDF (patient info, raw test values with page / line / source text) apart
+from how it was classified (ranges applied, status, score, narrative).
+rescore.py re-applies an updated reference CSV to these records without
+opening a single PDF.
+"""
+import os
+import json
+import math
+import tempfile
+from datetime import datetime
+
+from report_core import (
+    SCRIPT_DIR,
+    determine_age_gender_nums, select_reference, classify_result, classify_results, score_results,
+)
+
+STORE_DIR = os.path.join(SCRIPT_DIR, "extractions")
+
+def _num(v):
+    """JSON-safe form of a CSV low/high cell, comparable across loads."""
+    try:
+        f = float(v)
+        return None if math.isnan(f) else f
+    except (TypeError, ValueError):
+        return str(v)
+
+# ==============================
+#  1. RECORDS
+# ==============================
+def build_record(report_hash, source, info, raw_values, refs):
+    """Classify raw values against `refs` and wrap everything in a storable record."""
+    applied = {}
+    results = classify_results(info, raw_values, refs, applied)
+    return {
+        "report_hash": report_hash,
+        "source": source,
+        "extracted_at": datetime.now().isoformat(timespec="seconds"),
+        "info": info,
+        "raw": raw_values,
+        "ranges": {name: [_num(low), _num(high)] for name, (low, high) in applied.items()},
+        "results": results,
+        "summary": score_results(results),
+    }
+
+def rescore_record(record, refs):
+    """
+    Re-apply `refs` to a stored record, re-deriving status only for tests whose
+    applied (low, high) changed or that left the CSV; score and narrative are
+    rebuilt only if something changed. Updates the record in place and returns
+    the names of the tests that changed.
+    """
+    p_age, p_sex = determine_age_gender_nums(record["info"]["age_gender"])
+    previous = {r["name"]: r for r in record["results"]}
+    results, ranges, changed = [], {}, []
+
+    for raw in record["raw"]:
+        name = raw["name"]
+        rows = refs.get(name)
+        if not rows:
+            if name in previous: changed.append(name)
+            continue
+        low, high = select_reference(rows, p_age, p_sex)
+        ranges[name] = [_num(low), _num(high)]
+        if name in previous and record["ranges"].get(name) == ranges[name]:
+            results.append(previous[name])
+        else:
+            results.append(classify_result(raw, low, high))
+            changed.append(name)
+
+    if changed:
+        record["results"] = results
+        record["ranges"] = ranges
+        record["summary"] = score_results(results)
+        record["rescored_at"] = datetime.now().isoformat(timespec="seconds")
+    return changed
+
+# ==============================
+#  2. STORAGE
+# ==============================
+def record_path(report_hash, store_dir=None):
+    return os.path.join(store_dir or STORE_DIR, f"{report_hash}.json")
+
+def save_record(record, store_dir=None):
+    path = record_path(record["report_hash"], store_dir)
+    store_dir = os.path.dirname(path)
+    os.makedirs(store_dir, exist_ok=True)
+    # Own temp file per writer: two reports with the same hash may save at once
+    fd, tmp = tempfile.mkstemp(dir=store_dir, prefix=record["report_hash"] + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(record, f, indent=2)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp): os.remove(tmp)
+        raise
+    return path
+
+def load_record(report_hash, store_dir=None):
+    path = record_path(report_hash, store_dir)
+    if not os.path.exists(path): return None
+    with open(path) as f:
+        return json.load(f)
+
+def iter_records(store_dir=None):
+    """Yield every stored record."""
+    store_dir = store_dir or STORE_DIR
+    if not os.path.isdir(store_dir): return
+    for name in sorted(os.listdir(store_dir)):
+        if not name.endswith(".json"): continue
+        with open(os.path.join(store_dir, name)) as f:
+            yield json.load(f)
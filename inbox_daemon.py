@@ -0,0 +1,400 @@
+"""
+Meesha Inbox Daemon
+Watches the folder the LIS drops PDFs into and runs every report through a
+staged pipeline, so one report's extraction overlaps another's render:
+
+    inbox -> [extract] -> queue -> [render] -> queue -> [merge] -> outbox
+
+  extract : pdfplumber (CPU-bound)      -> isolated worker processes
+  render  : wkhtmltopdf, or --renderer native (summary_pdf, no temp file)
+                                        -> isolated worker processes
+  merge   : PdfWriter                   -> threads
+
+Extract and render jobs run under report_worker's timeout / RSS guards; a
+report that trips them lands in failed/ with a <name>.error.json beside it.
+
+Raw extracted values are archived per report (extraction_store) so
+rescore.py can apply updated reference ranges without re-parsing PDFs.
+
+Every queue is bounded, so a slow stage pushes back on the ones before it
+instead of piling reports up in memory.
+
+Usage:
+    python inbox_daemon.py --inbox "D:\\LIS\\Out" --outbox "D:\\LIS\\Summaries"
+"""
+import io
+import os
+import json
+import time
+import queue
+import shutil
+import logging
+import argparse
+import threading
+from contextlib import nullcontext
+
+from report_core import (
+    SCRIPT_DIR, CSV_DB_FILENAME, SUMMARY_ENGINES,
+    get_wkhtmltopdf_config, load_branding, build_summary_context, merge_report, report_hash,
+    load_reference_db, index_reference_db,
+)
+from extraction_store import STORE_DIR, build_record, save_record
+from report_profiling import ReportProfiler, should_profile
+from report_worker import (
+    WorkerPool, ReportWorkerError,
+    DEFAULT_EXTRACT_TIMEOUT, DEFAULT_RENDER_TIMEOUT, DEFAULT_MAX_RSS_MB, DEFAULT_MAX_JOBS,
+)
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+# ==============================
+#  1. STAGE BOOKKEEPING
+# ==============================
+class StageStats:
+    """Thread-safe counters for one pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.done = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds, ok=True):
+        with self._lock:
+            self.busy_seconds += seconds
+            if ok: self.done += 1
+            else: self.failed += 1
+
+    def snapshot(self, elapsed):
+        with self._lock:
+            finished = self.done + self.failed
+            return {
+                "stage": self.name,
+                "done": self.done,
+                "failed": self.failed,
+                "per_min": (self.done / elapsed * 60) if elapsed > 0 else 0.0,
+                "avg_s": (self.busy_seconds / finished) if finished else 0.0,
+            }
+
+# ==============================
+#  2. PIPELINE
+# ==============================
+class InboxPipeline:
+    def __init__(self, inbox, outbox, csv_path=None,
+                 extract_workers=2, render_workers=2, merge_workers=1, queue_size=8,
+                 extract_timeout=DEFAULT_EXTRACT_TIMEOUT, render_timeout=DEFAULT_RENDER_TIMEOUT,
+                 max_rss_mb=DEFAULT_MAX_RSS_MB, max_jobs=DEFAULT_MAX_JOBS, engine="wkhtmltopdf",
+                 profile_every=None, store_dir=STORE_DIR):
+        self.inbox = os.path.abspath(inbox)
+        self.outbox = os.path.abspath(outbox)
+        self.work_dir = os.path.join(self.inbox, ".processing")
+        self.summary_dir = os.path.join(self.work_dir, "summaries")
+        self.processed_dir = os.path.join(self.inbox, "processed")
+        self.failed_dir = os.path.join(self.inbox, "failed")
+        for d in (self.outbox, self.work_dir, self.summary_dir, self.processed_dir, self.failed_dir):
+            os.makedirs(d, exist_ok=True)
+
+        self.csv_path = csv_path or os.path.join(SCRIPT_DIR, CSV_DB_FILENAME)
+        self.engine = engine
+        self.profile_every = profile_every
+        self.store_dir = store_dir
+        self._refs = None
+        self._refs_mtime = None
+        self._refs_lock = threading.Lock()
+        self.logo_b64, self.footer_qr_b64 = load_branding()
+
+        self.workers = {"extract": extract_workers, "render": render_workers, "merge": merge_workers}
+        self.queues = {
+            "extract": queue.Queue(maxsize=queue_size),
+            "render": queue.Queue(maxsize=queue_size),
+            "merge": queue.Queue(maxsize=queue_size),
+        }
+        self.stats = {name: StageStats(name) for name in self.workers}
+        self.started_at = time.monotonic()
+
+        guards = dict(extract_timeout=extract_timeout, render_timeout=render_timeout,
+                      max_rss_mb=max_rss_mb, max_jobs=max_jobs)
+        self._extract_pool = WorkerPool(size=extract_workers, **guards)
+        self._render_pool = WorkerPool(size=render_workers, **guards)
+        self._threads = {name: [] for name in self.workers}
+        self._pending_sizes = {}
+        self._in_flight = 0
+        self._claimed = set()  # names currently in .processing
+        self._in_flight_lock = threading.Lock()
+
+    # --- Stage bodies ---
+    def _extract(self, job):
+        info, raw_values = self._extract_pool.extract_raw(
+            job["pdf_path"], self.csv_path, profile=self._profile_spec(job, "extract"))
+        if not info: raise RuntimeError("Could not read PDF")
+        record = build_record(report_hash(job["pdf_path"]), job["name"], info, raw_values, self._reference_index())
+        save_record(record, self.store_dir)
+        job["info"], job["full_results"] = info, record["results"]
+        return job
+
+    def _reference_index(self):
+        """Reference ranges, reloaded when the CSV changes on disk."""
+        mtime = os.path.getmtime(self.csv_path)
+        with self._refs_lock:
+            if mtime != self._refs_mtime:
+                df = load_reference_db(self.csv_path)
+                if df is None: raise RuntimeError(f"Could not load {self.csv_path}")
+                self._refs, self._refs_mtime = index_reference_db(df), mtime
+            return self._refs
+
+    def _render(self, job):
+        context = build_summary_context(job["info"], job["full_results"], self.logo_b64, self.footer_qr_b64)
+        if self.engine == "native":
+            job["summary"] = io.BytesIO(self._render_pool.render_native(context, profile=self._profile_spec(job, "render")))
+        else:
+            job["summary_pdf_path"] = os.path.join(self.summary_dir, os.path.splitext(job["name"])[0] + "_summary.pdf")
+            job["summary"] = self._render_pool.render(context, job["summary_pdf_path"], profile=self._profile_spec(job, "render"))
+        return job
+
+    def _merge(self, job):
+        out_path = self._output_path(job["name"])
+        profiler = job.get("profiler")
+        with profiler.stage("merge") if profiler else nullcontext():
+            merge_report(job["summary"], job["pdf_path"], out_path)
+        if job.get("summary_pdf_path"): os.remove(job["summary_pdf_path"])
+        shutil.move(job["pdf_path"], os.path.join(self.processed_dir, job["name"]))
+        logger.info(f"Done: {job['name']} in {time.monotonic() - job['queued_at']:.1f}s")
+        self._finish_profile(job)
+        return job
+
+    def _output_path(self, name):
+        return os.path.join(self.outbox, f"Analysis_{os.path.splitext(name)[0]}.pdf")
+
+    def _profile_spec(self, job, stage):
+        profiler = job.get("profiler")
+        return profiler.remote(stage) if profiler else None
+
+    def _finish_profile(self, job):
+        profiler = job.get("profiler")
+        if profiler is None: return
+        try:
+            saved = profiler.finish()
+            if saved: logger.info(f"Profile for {job['name']}: {saved[0] or saved[1]}")
+        except Exception as e:
+            logger.error(f"Could not write profile for {job['name']}: {e}")
+
+    def _fail(self, job, stage, err):
+        logger.error(f"{stage} failed for {job['name']}: {err}")
+        self._finish_profile(job)
+        try:
+            summary = job.get("summary_pdf_path")
+            if summary and os.path.exists(summary): os.remove(summary)
+            if os.path.exists(job["pdf_path"]):
+                shutil.move(job["pdf_path"], os.path.join(self.failed_dir, job["name"]))
+            detail = err.to_dict() if isinstance(err, ReportWorkerError) else \
+                {"error": "failed", "stage": stage, "message": f"{type(err).__name__}: {err}"}
+            with open(os.path.join(self.failed_dir, job["name"] + ".error.json"), "w") as f:
+                json.dump(detail, f, indent=2)
+        except Exception as e:
+            logger.error(f"Could not move {job['name']} to failed/: {e}")
+
+    def _stage_loop(self, name, fn, out_q):
+        in_q = self.queues[name]
+        while True:
+            job = in_q.get()
+            if job is _STOP: break
+            t0 = time.monotonic()
+            try:
+                job = fn(job)
+            except Exception as e:
+                self.stats[name].record(time.monotonic() - t0, ok=False)
+                self._fail(job, name, e)
+                self._finish(job)
+                continue
+            self.stats[name].record(time.monotonic() - t0)
+            if out_q is not None: out_q.put(job)
+            else: self._finish(job)
+
+    def _finish(self, job):
+        with self._in_flight_lock:
+            self._in_flight -= 1
+            self._claimed.discard(job["name"])
+
+    # --- Lifecycle ---
+    def start(self):
+        plan = [
+            ("extract", self._extract, self.queues["render"]),
+            ("render", self._render, self.queues["merge"]),
+            ("merge", self._merge, None),
+        ]
+        for name, fn, out_q in plan:
+            for i in range(self.workers[name]):
+                t = threading.Thread(target=self._stage_loop, args=(name, fn, out_q), name=f"{name}-{i}", daemon=True)
+                t.start()
+                self._threads[name].append(t)
+        self.requeue_leftovers()
+
+    def stop(self):
+        """Drain every stage in order, then shut the worker pools down."""
+        for name in ("extract", "render", "merge"):
+            for _ in self._threads[name]:
+                self.queues[name].put(_STOP)
+            for t in self._threads[name]:
+                t.join()
+        self._extract_pool.close()
+        self._render_pool.close()
+
+    def _queue(self, name, work_path):
+        with self._in_flight_lock:
+            self._in_flight += 1
+            self._claimed.add(name)
+        job = {"name": name, "pdf_path": work_path, "queued_at": time.monotonic()}
+        if should_profile(every=self.profile_every):
+            job["profiler"] = ReportProfiler(report_hash(work_path))
+        self.queues["extract"].put(job)
+
+    def _claim_name(self, name):
+        """
+        `name`, or a timestamped variant of it if a report with that name is
+        in flight or already filed, so nothing in .processing, processed/,
+        failed/ or the outbox gets overwritten.
+        """
+        stem, ext = os.path.splitext(name)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        candidate, n = name, 1
+        with self._in_flight_lock:
+            while (candidate in self._claimed
+                   or os.path.exists(os.path.join(self.work_dir, candidate))
+                   or os.path.exists(os.path.join(self.processed_dir, candidate))
+                   or os.path.exists(os.path.join(self.failed_dir, candidate))
+                   or os.path.exists(self._output_path(candidate))):
+                candidate = f"{stem}_{stamp}{ext}" if n == 1 else f"{stem}_{stamp}-{n}{ext}"
+                n += 1
+        return candidate
+
+    def requeue_leftovers(self):
+        """
+        Re-queue reports a previous run claimed but never filed (crash, kill).
+        They keep their claimed names, so their outputs overwrite only their own.
+        """
+        shutil.rmtree(self.summary_dir, ignore_errors=True)
+        os.makedirs(self.summary_dir, exist_ok=True)
+        names = sorted(e.name for e in os.scandir(self.work_dir)
+                       if e.is_file() and e.name.lower().endswith(".pdf"))
+        for name in names:
+            logger.info(f"Re-queuing {name} left in .processing by an earlier run")
+            self._queue(name, os.path.join(self.work_dir, name))
+        return len(names)
+
+    def scan_inbox(self):
+        """
+        Queue every PDF whose size has been stable for one poll (the LIS may
+        still be writing it). Blocks when the extract queue is full.
+        Returns the number of reports queued.
+        """
+        queued = 0
+        sizes = {}
+        for entry in os.scandir(self.inbox):
+            if not entry.is_file() or not entry.name.lower().endswith(".pdf"): continue
+            try:
+                size = entry.stat().st_size
+            except OSError:
+                continue
+            sizes[entry.name] = size
+            if self._pending_sizes.get(entry.name) != size: continue
+
+            # Claim the file so the next scan doesn't pick it up again
+            name = self._claim_name(entry.name)
+            work_path = os.path.join(self.work_dir, name)
+            try:
+                shutil.move(entry.path, work_path)
+            except OSError as e:
+                logger.warning(f"Could not claim {entry.name}: {e}")
+                continue
+            sizes.pop(entry.name)
+            if name != entry.name:
+                logger.warning(f"{entry.name} is already in flight or filed; processing it as {name}")
+            self._queue(name, work_path)
+            queued += 1
+        self._pending_sizes = sizes
+        return queued
+
+    def is_idle(self):
+        """True once nothing is waiting in the inbox or moving through the stages."""
+        with self._in_flight_lock:
+            return not self._pending_sizes and self._in_flight == 0
+
+    def status(self):
+        elapsed = time.monotonic() - self.started_at
+        return {
+            "queues": {name: q.qsize() for name, q in self.queues.items()},
+            "stages": [self.stats[name].snapshot(elapsed) for name in ("extract", "render", "merge")],
+        }
+
+    def log_status(self):
+        s = self.status()
+        depths = " ".join(f"{k}={v}" for k, v in s["queues"].items())
+        stages = " | ".join(
+            f"{st['stage']}: {st['done']} ok / {st['failed']} failed, {st['per_min']:.1f}/min, avg {st['avg_s']:.2f}s"
+            for st in s["stages"]
+        )
+        logger.info(f"Queues [{depths}] | {stages}")
+
+# ==============================
+#  3. CLI
+# ==============================
+def run(args):
+    if args.renderer == "wkhtmltopdf" and not get_wkhtmltopdf_config():
+        logger.error("'wkhtmltopdf' not found.")
+        return 1
+
+    pipeline = InboxPipeline(
+        args.inbox, args.outbox, csv_path=args.csv,
+        extract_workers=args.extract_workers, render_workers=args.render_workers,
+        merge_workers=args.merge_workers, queue_size=args.queue_size,
+        extract_timeout=args.extract_timeout, render_timeout=args.render_timeout,
+        max_rss_mb=args.max_rss_mb, max_jobs=args.max_jobs_per_worker, engine=args.renderer,
+        profile_every=args.profile_every, store_dir=args.store,
+    )
+    pipeline.start()
+    logger.info(f"Watching {pipeline.inbox} -> {pipeline.outbox}")
+
+    last_status = time.monotonic()
+    try:
+        while True:
+            pipeline.scan_inbox()
+            if args.once and pipeline.is_idle(): break
+            if time.monotonic() - last_status >= args.stats_interval:
+                pipeline.log_status()
+                last_status = time.monotonic()
+            time.sleep(args.poll_interval)
+    except KeyboardInterrupt:
+        logger.info("Stopping, letting in-flight reports finish...")
+    finally:
+        pipeline.stop()
+        pipeline.log_status()
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch an inbox folder and generate Meesha summaries.")
+    parser.add_argument("--inbox", required=True, help="Folder the LIS drops PDFs into")
+    parser.add_argument("--outbox", required=True, help="Folder for finished Analysis_*.pdf files")
+    parser.add_argument("--csv", default=None, help=f"Reference ranges (default: {CSV_DB_FILENAME})")
+    parser.add_argument("--renderer", choices=SUMMARY_ENGINES, default="wkhtmltopdf", help="Summary page engine")
+    parser.add_argument("--store", default=STORE_DIR, help="Raw extraction archive (for rescore.py)")
+    parser.add_argument("--extract-workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument("--render-workers", type=int, default=2)
+    parser.add_argument("--merge-workers", type=int, default=1)
+    parser.add_argument("--queue-size", type=int, default=8, help="Max reports waiting between stages")
+    parser.add_argument("--extract-timeout", type=float, default=DEFAULT_EXTRACT_TIMEOUT, help="Seconds per extraction")
+    parser.add_argument("--render-timeout", type=float, default=DEFAULT_RENDER_TIMEOUT, help="Seconds per render")
+    parser.add_argument("--max-rss-mb", type=int, default=DEFAULT_MAX_RSS_MB, help="Kill a worker above this RSS")
+    parser.add_argument("--max-jobs-per-worker", type=int, default=DEFAULT_MAX_JOBS, help="Recycle workers after N jobs")
+    parser.add_argument("--profile-every", type=int, default=None,
+                        help="CPU-profile one report in N (default: MEESHA_PROFILE)")
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds between inbox scans")
+    parser.add_argument("--stats-interval", type=float, default=30.0, help="Seconds between status lines")
+    parser.add_argument("--once", action="store_true", help="Process what is in the inbox, then exit")
+    return run(parser.parse_args())
+
+if __name__ == "__main__":
+    raise SystemExit(main())
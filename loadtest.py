@@ -0,0 +1,296 @@
+"""
+Meesha Load Test
+Drives report_core.process_report with N synthetic lab reports in flight at
+once and reports latency percentiles, throughput, and CPU / RSS per stage.
+Runs entirely locally.
+
+  --mode pool     : N threads sharing a report_worker.WorkerPool of
+                    --pool-size workers, exactly as app.main runs uploads
+                    (spawn startup, pickling and the pool cap included)
+  --mode thread   : one process, N threads, every stage in-process
+  --mode process  : N worker processes, every stage in-process
+                    (upper bound for extraction scaling)
+  --renderer native : pure-Python summary page instead of wkhtmltopdf
+  --renderer stub   : placeholder page so extraction scaling is measured alone
+                      (--stub-renderer is shorthand)
+
+Usage:
+    python loadtest.py --reports 40 --concurrency 8
+    python loadtest.py --reports 40 --concurrency 8 --stub-renderer --json out.json
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from report_core import (
+    SCRIPT_DIR, CSV_DB_FILENAME,
+    get_wkhtmltopdf_config, load_reference_db, load_branding, process_report,
+)
+from report_worker import WorkerPool, DEFAULT_POOL_SIZE, process_rss_bytes
+
+STAGES = ("extract", "render", "merge")
+
+# Tests written into every synthetic report (names as in test_and_values.csv)
+SYNTH_PANEL = [
+    "Haemoglobin", "Platelet Count", "TSH", "HBA1C", "ESR", "Neutrophils",
+    "Lymphocytes", "Eosinophils", "Monocytes", "Basophils", "M.C.V.", "M.C.H.",
+    "M.C.H.C.", "Hematocrit(PCV)", "C-Reactive Protein", "Blood Sugar (F)",
+]
+
+# ==============================
+#  1. SYNTHETIC REPORTS
+# ==============================
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def write_text_pdf(path, pages):
+    """
+    Write a minimal A4 PDF with one Courier text line per entry.
+    `pages` is a list of pages, each a list of strings.
+    """
+    objects = [None, None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier >>"]
+    page_ids = []
+    for lines in pages:
+        ops = ["BT", "/F1 9 Tf", "11 TL", "40 800 Td"]
+        for line in lines:
+            ops.append(f"({_pdf_escape(line)}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(("<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                        f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>").encode())
+        page_ids.append(len(objects))
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    kids = " ".join(f"{i} 0 R" for i in page_ids)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+    xref_at = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for off in offsets:
+        out += b"%010d 00000 n \n" % off
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_at)
+    with open(path, "wb") as f:
+        f.write(out)
+    return path
+
+def make_synthetic_report(path, index, df, rng, pages=1):
+    """Write a fake lab report whose values sit in, near, and far outside range."""
+    header = [
+        "MEESHA DIAGNOSTICS - LOAD TEST",
+        f"Patient Name : Mr. Load Test {index}",
+        f"Patient Id : LT{index:05d}",
+        f"Age / Gender : {rng.randint(18, 80)} Y / {rng.choice(['Male', 'Female'])}",
+        f"Reported On : {rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2024",
+        "",
+        f"{'Test':<28}{'Result':>12}  {'Reference':<18}",
+    ]
+    body = []
+    for name in SYNTH_PANEL:
+        rows = df[df["testname"].astype(str).str.strip() == name]
+        if rows.empty: continue
+        low, high = float(rows.iloc[0]["lowvalue"]), float(rows.iloc[0]["uppervalue"])
+        span = max(high - low, 0.1)
+        val = round(low + span * rng.uniform(-0.5, 1.5), 2)
+        body.append(f"{name:<28}{val:>12}  {low:g} - {high:g}")
+    filler = [f"Remarks: synthetic line {i} for page weight." for i in range(40)]
+    write_text_pdf(path, [header + body] + [filler] * (pages - 1))
+    return path
+
+def stub_renderer(html_out, summary_pdf_path, config):
+    """Stand-in for wkhtmltopdf: a one-page PDF, no subprocess."""
+    return write_text_pdf(summary_pdf_path, [["Meesha Diagnostics - stub summary page"]])
+
+# ==============================
+#  2. MEASUREMENT
+# ==============================
+def _rss_mb():
+    """Current RSS of this process in MB (peak RSS where that's all we can get)."""
+    rss = process_rss_bytes(os.getpid())
+    if rss is not None: return rss / 1e6
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+    except ImportError:
+        return None
+
+def percentile(values, pct):
+    """Nearest-rank percentile."""
+    if not values: return None
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[k]
+
+def _children_cpu():
+    t = os.times()
+    return t.children_user + t.children_system
+
+def run_one(pdf_path, out_dir, csv_path, renderer, logo_b64, footer_qr_b64, pool=None, own_children=False):
+    """
+    Process one report; return its latency and per-stage wall / CPU / RSS.
+
+    cpu    : this thread, plus the pool worker's CPU for stages run in `pool`,
+             plus reaped child processes (wkhtmltopdf) when `own_children`
+             says this process runs one report at a time.
+    rss_mb : the pool worker's RSS after its job for pooled stages, otherwise
+             this whole process (shared by every thread in it).
+    """
+    stages = {}
+
+    @contextmanager
+    def meter(name):
+        w0, c0, k0 = time.perf_counter(), time.thread_time(), _children_cpu()
+        u0 = pool.thread_usage() if pool is not None else None
+        try:
+            yield
+        finally:
+            cpu, rss = time.thread_time() - c0, _rss_mb()
+            if own_children: cpu += _children_cpu() - k0
+            if pool is not None:
+                u1 = pool.thread_usage()
+                if u1["jobs"] > u0["jobs"]:
+                    cpu += u1["cpu_s"] - u0["cpu_s"]
+                    rss = u1["rss_bytes"] / 1e6 if u1["rss_bytes"] is not None else None
+            stages[name] = {"wall": time.perf_counter() - w0, "cpu": cpu, "rss_mb": rss}
+
+    out_path = os.path.join(out_dir, "out_" + os.path.basename(pdf_path))
+    t0 = time.perf_counter()
+    error = None
+    try:
+        process_report(pdf_path, out_path, csv_path=csv_path, logo_b64=logo_b64, footer_qr_b64=footer_qr_b64,
+                       renderer=stub_renderer if renderer == "stub" else None, on_stage=meter,
+                       engine="native" if renderer == "native" else "wkhtmltopdf", pool=pool)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        if os.path.exists(out_path): os.remove(out_path)
+    return {"latency": time.perf_counter() - t0, "stages": stages, "error": error}
+
+# ==============================
+#  3. RUNNER
+# ==============================
+def run_load(reports=20, concurrency=4, mode="pool", renderer="wkhtmltopdf", pages=1, csv_path=None, seed=7,
+             pool_size=DEFAULT_POOL_SIZE):
+    csv_path = csv_path or os.path.join(SCRIPT_DIR, CSV_DB_FILENAME)
+    df = load_reference_db(csv_path)
+    if df is None: raise RuntimeError(f"Could not load {csv_path}")
+    if renderer == "wkhtmltopdf" and get_wkhtmltopdf_config() is None:
+        raise RuntimeError("'wkhtmltopdf' not found (use --renderer native or stub).")
+    logo_b64, footer_qr_b64 = load_branding()
+
+    work_dir = tempfile.mkdtemp(prefix="meesha_load_")
+    workers = WorkerPool(size=pool_size) if mode == "pool" else None
+    try:
+        rng = random.Random(seed)
+        inputs = [make_synthetic_report(os.path.join(work_dir, f"report_{i:05d}.pdf"), i, df, rng, pages)
+                  for i in range(reports)]
+
+        pool_cls = ProcessPoolExecutor if mode == "process" else ThreadPoolExecutor
+        t_before = os.times()
+        t0 = time.perf_counter()
+        with pool_cls(max_workers=concurrency) as pool:
+            # Child CPU is only attributable per report when nothing else runs in this process
+            own_children = mode == "process" or concurrency == 1
+            futures = [pool.submit(run_one, p, work_dir, csv_path, renderer, logo_b64, footer_qr_b64,
+                                   workers, own_children)
+                       for p in inputs]
+            results = [f.result() for f in futures]
+        elapsed = time.perf_counter() - t0
+        t_after = os.times()
+    finally:
+        if workers is not None: workers.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    ok = [r for r in results if not r["error"]]
+    latencies = [r["latency"] for r in ok]
+    summary = {
+        "reports": reports,
+        "concurrency": concurrency,
+        "mode": mode,
+        "pool_size": pool_size if mode == "pool" else None,
+        "stage_cpu_includes_children": mode == "pool" or mode == "process" or concurrency == 1,
+        "renderer": renderer,
+        "pages": pages,
+        "errors": len(results) - len(ok),
+        "first_error": next((r["error"] for r in results if r["error"]), None),
+        "elapsed_s": elapsed,
+        "throughput_per_s": len(ok) / elapsed if elapsed > 0 else 0.0,
+        "latency_s": {f"p{p}": percentile(latencies, p) for p in (50, 95, 99)},
+        "cpu_s": {
+            "self": (t_after.user - t_before.user) + (t_after.system - t_before.system),
+            "children": (t_after.children_user - t_before.children_user) + (t_after.children_system - t_before.children_system),
+        },
+        "stages": {},
+    }
+    for name in STAGES:
+        rows = [r["stages"][name] for r in ok if name in r["stages"]]
+        walls = [s["wall"] for s in rows]
+        rss = [s["rss_mb"] for s in rows if s["rss_mb"] is not None]
+        summary["stages"][name] = {
+            "wall_p50_s": percentile(walls, 50),
+            "wall_p95_s": percentile(walls, 95),
+            "cpu_avg_s": sum(s["cpu"] for s in rows) / len(rows) if rows else None,
+            "rss_max_mb": max(rss) if rss else None,
+        }
+    return summary
+
+def print_summary(s):
+    fmt = lambda v, spec=".3f": "-" if v is None else format(v, spec)
+    mode = f"pool of {s['pool_size']}" if s["pool_size"] else s["mode"]
+    print(f"\n{s['reports']} reports, concurrency {s['concurrency']} ({mode}), "
+          f"renderer={s['renderer']}, pages={s['pages']}")
+    print(f"  elapsed    : {s['elapsed_s']:.2f}s   throughput: {s['throughput_per_s']:.2f} reports/s   errors: {s['errors']}")
+    if s["first_error"]: print(f"  first error: {s['first_error']}")
+    lat = s["latency_s"]
+    print(f"  latency    : p50 {fmt(lat['p50'])}s   p95 {fmt(lat['p95'])}s   p99 {fmt(lat['p99'])}s")
+    print(f"  cpu        : self {s['cpu_s']['self']:.2f}s   children (wkhtmltopdf / workers) {s['cpu_s']['children']:.2f}s")
+    print(f"\n  {'stage':<8}{'wall p50':>10}{'wall p95':>10}{'cpu avg':>10}{'rss max MB':>12}")
+    for name, st in s["stages"].items():
+        print(f"  {name:<8}{fmt(st['wall_p50_s']):>10}{fmt(st['wall_p95_s']):>10}"
+              f"{fmt(st['cpu_avg_s']):>10}{fmt(st['rss_max_mb'], '.1f'):>12}")
+    if s["pool_size"]:
+        print("\n  extract / render: CPU and RSS of the pool worker that ran the job; merge: this process")
+    else:
+        print("\n  rss is whole-process, shared by every report in flight in it")
+    if not s["stage_cpu_includes_children"]:
+        print("  cpu is this thread only; wkhtmltopdf CPU is in the children total above")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Meesha report pipeline with synthetic PDFs.")
+    parser.add_argument("--reports", type=int, default=20, help="Total synthetic reports to process")
+    parser.add_argument("--concurrency", type=int, default=4, help="Reports in flight at once")
+    parser.add_argument("--mode", choices=("pool", "thread", "process"), default="pool")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE,
+                        help="Isolated workers in --mode pool (default: what the app uses)")
+    parser.add_argument("--renderer", choices=("wkhtmltopdf", "native", "stub"), default="wkhtmltopdf")
+    parser.add_argument("--stub-renderer", action="store_true", help="Same as --renderer stub")
+    parser.add_argument("--pages", type=int, default=1, help="Pages per synthetic report")
+    parser.add_argument("--csv", default=None, help=f"Reference ranges (default: {CSV_DB_FILENAME})")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", default=None, help="Also write the summary to this file")
+    args = parser.parse_args()
+
+    renderer = "stub" if args.stub_renderer else args.renderer
+    summary = run_load(args.reports, args.concurrency, args.mode, renderer,
+                       args.pages, args.csv, args.seed, args.pool_size)
+    print_summary(summary)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,578 @@
+import pdfplumber
+import re
+import pandas as pd
+import os
+import shutil
+import logging
+import pdfkit
+from pypdf import PdfWriter
+from datetime import datetime
+import base64
+import hashlib
+import io
+from contextlib import nullcontext, ExitStack
+from jinja2 import Environment, BaseLoader
+from report_profiling import ReportProfiler, should_profile
+
+logger = logging.getLogger(__name__)
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CSV_DB_FILENAME = "test_and_values.csv"
+
+# ==============================
+#  1. SPECIAL KEYWORDS & HELPERS
+# ==============================
+SPECIAL_KEYWORDS = {
+    "HBA1C": ["hba1c", "glycosylated", "glyco hb"],
+    "TSH": ["tsh", "thyroid stimulating"],
+    "PLATELET COUNT": ["platelet count", "platelet", "plt"],
+    "R.B.C. COUNT": ["r.b.c. count", "rbc count", "red blood cell"],
+    "HAEMOGLOBIN": ["haemoglobin", "hemoglobin", "hb"],
+    "WBC": ["total white blood", "wbc", "leukocyte", "white blood cell"],
+    "RDW-CV": ["rdw-cv", "rdw cv"],
+    "NEUTROPHILS": ["neutrophils", "neutrophil"],
+    "LYMPHOCYTES": ["lymphocytes", "lymphocyte"],
+    "EOSINOPHILS": ["eosinophils", "eosinophil"],
+    "MONOCYTES": ["monocytes", "monocyte"],
+    "BASOPHILS": ["basophils", "basophil"],
+    "M.C.H.C": ["m.c.h.c", "mchc"],
+    "M.C.V.": ["m.c.v.", "mcv", "mean corpuscular volume"],
+    "M.C.H.": ["m.c.h.", "mch", "mean corpuscular hemoglobin"],
+    "HEMATOCRIT": ["hematocrit", "pcv", "packed cell volume"],
+}
+
+def load_reference_db(csv_path):
+    """Load reference CSV."""
+    try:
+        df = pd.read_csv(csv_path)
+        df.columns = df.columns.str.lower().str.strip()
+        return df
+    except Exception as e:
+        logger.error(f"Error loading CSV database: {e}")
+        return None
+
+def determine_age_gender_nums(age_gender_str):
+    """Parse Age/Gender string."""
+    try:
+        age = 30
+        sex = "Both"
+        age_match = re.search(r"(\d{1,3})", age_gender_str)
+        if age_match:
+            age = int(age_match.group(1))
+        lower = age_gender_str.lower()
+        if "female" in lower or " f " in lower:
+            sex = "Female"
+        elif "male" in lower or " m " in lower:
+            sex = "Male"
+        return age, sex
+    except:
+        return 30, "Both"
+
+def get_status(value, low, high):
+    """Compare value vs reference."""
+    try:
+        val = float(value); l = float(low); h = float(high)
+        if val < l:
+            if val < (l * 0.7): return "Crit Low", "crit"
+            return "Low", "warn"
+        elif val > h:
+            if val > (h * 1.3): return "Crit High", "crit"
+            return "High", "warn"
+        return "Normal", "norm"
+    except:
+        return "Normal", "norm"
+
+def report_hash(pdf_path):
+    """Short content hash identifying a report (profiles, cached extractions)."""
+    h = hashlib.sha256()
+    with open(pdf_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()[:16]
+
+def get_base64_image(image_path):
+    if image_path and os.path.exists(image_path):
+        with open(image_path, "rb") as img_file:
+            return base64.b64encode(img_file.read()).decode("utf-8")
+    return None
+
+def get_wkhtmltopdf_config():
+    path = shutil.which("wkhtmltopdf")
+    if path: return pdfkit.configuration(wkhtmltopdf=path)
+    
+    common_paths = [
+        r"C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe",
+        r"C:\Program Files (x86)\wkhtmltopdf\bin\wkhtmltopdf.exe"
+    ]
+    for p in common_paths:
+        if os.path.exists(p): return pdfkit.configuration(wkhtmltopdf=p)
+    return None
+
+# ==============================
+#  2. SMART EXTRACTION LOGIC
+# ==============================
+def extract_raw_data(pdf_path, df):
+    """
+    Advanced extraction with 'Three-Number Rule' to distinguish Results from Ranges.
+    Returns (info, raw_values): one {name, value, page, line, text} per test
+    found, with no reference ranges applied. `df` supplies the test names.
+    """
+    full_text_lines = []
+    line_pos = []  # (page, line) for each entry of full_text_lines, 1-based
+    
+    # 1. Read PDF with Layout
+    try:
+        with pdfplumber.open(pdf_path) as pdf:
+            for page_no, page in enumerate(pdf.pages, start=1):
+                txt = page.extract_text(layout=True)
+                if txt:
+                    lines = txt.split('\n')
+                    full_text_lines.extend(lines)
+                    line_pos.extend((page_no, i) for i in range(1, len(lines) + 1))
+    except Exception as e:
+        return {}, []
+
+    # Join for Basic Info regex
+    full_text_blob = "\n".join(full_text_lines)
+
+    # --- Basic Info Extraction ---
+    info = { "patient_name": "Unknown", "treatment_id": "Unknown", "age_gender": "Unknown", "doctor": "Unknown", "date": "Unknown" }
+    
+    nm = re.search(r"(?:Patient\s*Name|Name)\s*[:\-\.]?\s*(Mrs\.|Mr\.|Ms\.)?\s*([A-Za-z\s\.]+)", full_text_blob, re.IGNORECASE)
+    if nm: info["patient_name"] = re.sub(r"(Patient\s*Name|Name)\s*[:\-\.]*", "", nm.group(0), flags=re.IGNORECASE).strip()
+
+    id_m = re.search(r"(?:Patient\s*Id|Id|ID|Treatment\s*id)\s*[:\-\.]?\s*(\w+)", full_text_blob, re.IGNORECASE)
+    if id_m: info["treatment_id"] = id_m.group(1).strip()
+
+    ag_m = re.search(r"(\d{1,3})\s*[Yy]?\w*\s*[\/\-]\s*(Male|Female|M|F)", full_text_blob, re.IGNORECASE)
+    if ag_m: info["age_gender"] = f"{ag_m.group(1)} Y / {ag_m.group(2)}"
+
+    dt_m = re.search(r"(?:Registered|Reported|Date)\s*(?:On)?\s*[:\-\.]?\s*(\d{2}[\/\-\.]\d{2}[\/\-\.]\d{2,4})", full_text_blob, re.IGNORECASE)
+    if dt_m: info["date"] = dt_m.group(1)
+
+    # --- Test Extraction ---
+    if df is None: return info, []
+    
+    raw_values = []
+    unique_tests = df["testname"].astype(str).unique()
+
+    for test_name in unique_tests:
+        base_name = str(test_name).strip()
+        if not base_name: continue
+
+        # Get Keywords
+        keywords = SPECIAL_KEYWORDS.get(base_name.upper(), [base_name.lower()])
+
+        # Find Line
+        match_line = None
+        for idx, line in enumerate(full_text_lines):
+            if any(k in line.lower() for k in keywords):
+                match_line = line
+                break
+        
+        if not match_line: continue
+
+        # --- LOGIC START ---
+        
+        # 1. Clean Hyphenated Ranges (e.g. "13-17")
+        clean_line = re.sub(r'\d+(?:\.\d+)?\s*-\s*\d+(?:\.\d+)?', ' ', match_line)
+
+        # 2. Check for Flags (High Confidence)
+        flag_match = re.search(r'(\d+(?:,\d+)*(?:\.\d+)?)\s*([HL]|High|Low)\b', clean_line)
+        
+        final_val = None
+
+        if flag_match:
+            try:
+                final_val = float(flag_match.group(1).replace(",", ""))
+            except: pass
+        else:
+            # 3. No Flag? Apply "Three Number Rule"
+            raw_nums = re.findall(r'(\d+(?:,\d+)*(?:\.\d+)?)', clean_line)
+            valid_nums = []
+            for rs in raw_nums:
+                try:
+                    v = float(rs.replace(",", ""))
+                    if 2020 <= v <= 2030 and v.is_integer():
+                         if "platelet" not in base_name.lower() and "wbc" not in base_name.lower():
+                             continue
+                    valid_nums.append(v)
+                except: pass
+            
+            if not valid_nums: continue
+
+            if len(valid_nums) >= 3:
+                # [Result, Low, High] -> [15.2, 13, 17] -> 13 < 17? Yes, so Result is #1
+                if valid_nums[1] < valid_nums[2]:
+                     final_val = valid_nums[0]
+                else:
+                    final_val = valid_nums[0]
+            elif len(valid_nums) >= 1:
+                 final_val = valid_nums[0]
+
+        if final_val is None: continue
+
+        page_no, line_no = line_pos[idx]
+        raw_values.append({
+            "name": base_name,
+            "value": final_val,
+            "page": page_no,
+            "line": line_no,
+            "text": match_line.strip()
+        })
+
+    return info, raw_values
+
+# ==============================
+#  2b. CLASSIFICATION (reference ranges)
+# ==============================
+def index_reference_db(df):
+    """Group reference rows by test name, keeping CSV order within each test."""
+    refs = {}
+    for row in df.to_dict("records"):
+        refs.setdefault(str(row["testname"]).strip(), []).append(row)
+    return refs
+
+def select_reference(rows, p_age, p_sex):
+    """Pick the (low, high) row matching the patient's age and sex."""
+    ref_row = rows[0]
+    for row in rows:
+        if row["fromage"] <= p_age <= row["toage"]:
+            if row["sextype"] == "Both" or row["sextype"].lower() == p_sex.lower():
+                ref_row = row
+                break
+    return ref_row["lowvalue"], ref_row["uppervalue"]
+
+def classify_result(raw, low, high):
+    status, css = get_status(raw["value"], low, high)
+    return {
+        "name": raw["name"],
+        "value": raw["value"],
+        "range": f"{low} - {high}",
+        "status": status,
+        "css_class": css
+    }
+
+def classify_results(info, raw_values, refs, applied=None):
+    """
+    Apply reference ranges (from index_reference_db) to raw extracted values.
+    If `applied` is a dict it receives {test name: (low, high)} as used.
+    """
+    p_age, p_sex = determine_age_gender_nums(info["age_gender"])
+    found_tests = []
+    for raw in raw_values:
+        rows = refs.get(raw["name"])
+        if not rows: continue
+        low, high = select_reference(rows, p_age, p_sex)
+        if applied is not None: applied[raw["name"]] = (low, high)
+        found_tests.append(classify_result(raw, low, high))
+    return found_tests
+
+def extract_comprehensive_data(pdf_path, csv_path):
+    """Extract raw values from the PDF and classify them against the CSV ranges."""
+    df = load_reference_db(csv_path)
+    if df is None: raise RuntimeError(f"Could not load reference ranges from {csv_path}")
+    info, raw_values = extract_raw_data(pdf_path, df)
+    if not info: return info, []  # unreadable PDF
+    return info, classify_results(info, raw_values, index_reference_db(df))
+
+# ==============================
+#  3. PROFESSIONAL TEMPLATE
+# ==============================
+HTML_TEMPLATE = """
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <title>Meesha Health Analysis</title>
+    <style>
+        body { font-family: 'Segoe UI', Helvetica, Arial, sans-serif; margin: 0; padding: 0; background: #fff; color: #1e293b; font-size: 10pt; line-height: 1.3; -webkit-print-color-adjust: exact; }
+        .container { width: 100%; max-width: 100%; }
+        .header { border-bottom: 2px solid #0f766e; padding-bottom: 10px; margin-bottom: 20px; display: table; width: 100%; }
+        .header-left { display: table-cell; vertical-align: middle; }
+        .header-right { display: table-cell; vertical-align: middle; text-align: right; }
+        .brand-title { color: #0f766e; font-size: 20px; font-weight: 800; text-transform: uppercase; }
+        .brand-sub { font-size: 10px; color: #64748b; }
+        .meta-text { font-size: 9px; color: #334155; }
+        .patient-box { background-color: #f8fafc; border: 1px solid #e2e8f0; border-left: 4px solid #0f766e; padding: 10px; margin-bottom: 20px; display: table; width: 100%; }
+        .p-col { display: table-cell; width: 25%; vertical-align: top; padding-right: 10px; }
+        .p-lbl { font-size: 8px; text-transform: uppercase; color: #64748b; font-weight: 700; display: block; }
+        .p-val { font-size: 11px; font-weight: 600; color: #0f172a; display: block; }
+        .stats-table { width: 100%; border-collapse: separate; border-spacing: 10px 0; margin-bottom: 20px; table-layout: fixed; }
+        .stat-cell { border: 1px solid #e2e8f0; border-radius: 6px; padding: 10px; text-align: center; vertical-align: middle; }
+        .stat-val { font-size: 18px; font-weight: 800; display: block; }
+        .stat-lbl { font-size: 9px; text-transform: uppercase; color: #64748b; font-weight: 700; margin-top: 2px; display: block; }
+        .bg-score { background: #0f172a; color: white; border: none; }
+        .bg-score .stat-val { color: #2dd4bf; }
+        .risk-tag { background: #2dd4bf; color: #0f172a; font-size: 8px; padding: 2px 6px; border-radius: 4px; font-weight: 700; display: inline-block; margin-top: 4px; }
+        .summary-box { background: #f0fdfa; border: 1px solid #ccfbf1; border-radius: 6px; padding: 15px; margin-bottom: 20px; }
+        .sec-title { font-size: 12px; font-weight: 800; color: #0f766e; text-transform: uppercase; margin-bottom: 8px; border-bottom: 1px solid #d1fae5; padding-bottom: 4px; }
+        .summary-text { font-size: 10pt; color: #334155; text-align: justify; line-height: 1.5; }
+        table.main-table { width: 100%; border-collapse: collapse; font-size: 9pt; }
+        table.main-table th { background: #0f766e; color: white; padding: 8px 10px; text-align: left; font-weight: 700; text-transform: uppercase; font-size: 8pt; }
+        table.main-table td { padding: 8px 10px; border-bottom: 1px solid #e2e8f0; vertical-align: middle; color: #334155; }
+        table.main-table tr:nth-child(even) { background-color: #f8fafc; }
+        .res-val { font-weight: 700; color: #0f172a; }
+        .res-range { font-size: 7pt; color: #94a3b8; display: block; margin-top: 2px; }
+        .badge { padding: 4px 8px; border-radius: 4px; font-size: 8px; font-weight: 700; text-transform: uppercase; display: inline-block; min-width: 60px; text-align: center; }
+        .crit { background: #fee2e2; color: #991b1b; }
+        .warn { background: #fffbeb; color: #b45309; }
+        .norm { background: #dcfce7; color: #15803d; }
+        .footer { margin-top: 30px; border-top: 1px solid #cbd5e1; padding-top: 10px; display: table; width: 100%; }
+        .sig-name { font-family: 'Times New Roman', serif; font-weight: bold; font-size: 14px; }
+        .sig-role { font-size: 8px; text-transform: uppercase; color: #0f766e; font-weight: 700; }
+    </style>
+</head>
+<body>
+<div class="container">
+    <div class="header">
+        <div class="header-left">
+            {% if logo_b64 %}
+                <img src="data:image/jpeg;base64,{{ logo_b64 }}" style="height:50px; margin-right:15px; vertical-align:middle;">
+            {% endif %}
+            <div style="display:inline-block; vertical-align:middle;">
+                <div class="brand-title">Meesha Diagnostics</div>
+                <div class="brand-sub">AI Clinical Analysis Report</div>
+            </div>
+        </div>
+        <div class="header-right">
+            <div class="meta-text">
+                <strong>DATE:</strong> {{ report_date }}<br>
+                <strong>ID:</strong> {{ treatment_id }}
+            </div>
+        </div>
+    </div>
+
+    <div class="patient-box">
+        <div class="p-col"><span class="p-lbl">Patient Name</span><span class="p-val">{{ patient_name }}</span></div>
+        <div class="p-col"><span class="p-lbl">Age / Gender</span><span class="p-val">{{ patient_age_gender }}</span></div>
+        <div class="p-col"><span class="p-lbl">Referred By</span><span class="p-val">{{ doctor_name }}</span></div>
+        <div class="p-col" style="text-align:right;"><span class="p-lbl">Lab ID</span><span class="p-val">{{ treatment_id }}</span></div>
+    </div>
+
+    <table class="stats-table">
+        <tr>
+            <td class="stat-cell bg-score" width="25%">
+                <span class="stat-val">{{ overall_score }}/10</span>
+                <span class="stat-lbl" style="color:#94a3b8;">Health Score</span>
+                <span class="risk-tag">{{ risk_label }}</span>
+            </td>
+            <td class="stat-cell" width="25%">
+                <span class="stat-val" style="color:#15803d;">{{ count_normal }}</span>
+                <span class="stat-lbl">Normal</span>
+            </td>
+            <td class="stat-cell" width="25%">
+                <span class="stat-val" style="color:#b45309;">{{ count_warn }}</span>
+                <span class="stat-lbl">Warning</span>
+            </td>
+            <td class="stat-cell" width="25%">
+                <span class="stat-val" style="color:#991b1b;">{{ count_crit }}</span>
+                <span class="stat-lbl">Critical</span>
+            </td>
+        </tr>
+    </table>
+
+    <div class="summary-box">
+        <div class="sec-title">🤖 AI Executive Summary</div>
+        <div class="summary-text">{{ narrative }}</div>
+    </div>
+
+    <div style="margin-bottom: 20px;">
+        <div class="sec-title">📊 Biomarker Analysis</div>
+        <table class="main-table">
+            <thead><tr><th width="40%">Test Name</th><th width="30%">Result / Range</th><th width="30%">Analysis</th></tr></thead>
+            <tbody>
+                {% for test in full_results %}
+                <tr>
+                    <td><b>{{ test.name }}</b></td>
+                    <td><span class="res-val">{{ test.value }}</span><span class="res-range">Ref: {{ test.range }}</span></td>
+                    <td>
+                        {% if 'Crit' in test.status %}<span class="badge crit">CRITICAL</span>
+                        {% elif 'Normal' in test.status %}<span class="badge norm">NORMAL</span>
+                        {% else %}<span class="badge warn">ABNORMAL</span>{% endif %}
+                    </td>
+                </tr>
+                {% endfor %}
+            </tbody>
+        </table>
+    </div>
+
+    <div class="footer">
+        <div style="display:table-cell; width:60%; vertical-align:bottom;">
+            <div style="font-size:9px; color:#64748b;">
+                <strong>📍 Mahalaxmi Branch:</strong> 1st Floor, La View, B.J. Marg, Jacob Circle<br>
+                <strong>📍 BKC Centre:</strong> 310, Trade Center, BKC, Mumbai
+            </div>
+        </div>
+        <div style="display:table-cell; width:40%; vertical-align:bottom; text-align:right;">
+            {% if footer_qr %}
+                <img src="data:image/png;base64,{{ footer_qr }}" style="height:45px; margin-bottom:5px;">
+            {% endif %}
+            <div class="sig-name">Dr. Sudha TR</div>
+            <div class="sig-role">Consultant Pathologist</div>
+        </div>
+    </div>
+</div>
+</body>
+</html>
+"""
+
+# ==============================
+#  4. REPORT PIPELINE
+# ==============================
+# "wkhtmltopdf": HTML_TEMPLATE through pdfkit. "native": summary_pdf draws it directly.
+SUMMARY_ENGINES = ("wkhtmltopdf", "native")
+
+PDFKIT_OPTIONS = {
+    "page-size": "A4",
+    "margin-top": "15mm", "margin-right": "15mm",
+    "margin-bottom": "15mm", "margin-left": "15mm",
+    "encoding": "UTF-8", "no-outline": None,
+    "zoom": "1.0", "disable-smart-shrinking": None
+}
+
+_TEMPLATE = Environment(loader=BaseLoader()).from_string(HTML_TEMPLATE)
+
+def load_branding():
+    """Return (logo_b64, footer_qr_b64) for the report header and footer."""
+    logo_path = os.path.join(SCRIPT_DIR, "meesha_logo.jpeg")
+    if not os.path.exists(logo_path): logo_path = r"C:\Users\sunil\Desktop\MeeshaReport\meesha_logo.jpeg"
+
+    qr_path = os.path.join(SCRIPT_DIR, "meesha_qr.png")
+    if not os.path.exists(qr_path): qr_path = r"C:\Users\sunil\Desktop\meesha_qr.png"
+
+    return get_base64_image(logo_path), get_base64_image(qr_path)
+
+def score_results(full_results):
+    """Health score, risk label, narrative and status counts for classified tests."""
+    total = len(full_results)
+    count_normal = sum(1 for r in full_results if "Normal" in r["status"])
+    count_crit = sum(1 for r in full_results if "Crit" in r["status"])
+    count_warn = total - count_normal - count_crit
+
+    score = max(1, 10 - (count_crit * 2) - count_warn)
+    risk_label = "Low Risk" if score >= 8 else "Moderate" if score >= 5 else "High Risk"
+
+    narrative = "All systems look stable."
+    if count_crit > 0:
+        crit_names = ", ".join([t['name'] for t in full_results if "Crit" in t['status']][:3])
+        narrative = f"<b>Critical Alert:</b> Tests such as {crit_names} are significantly outside range."
+    elif count_warn > 0:
+        narrative = f"<b>Note:</b> {count_warn} tests show mild deviations."
+
+    return dict(
+        overall_score=score,
+        risk_label=risk_label,
+        narrative=narrative,
+        count_normal=count_normal,
+        count_warn=count_warn,
+        count_crit=count_crit
+    )
+
+def build_summary_context(info, full_results, logo_b64=None, footer_qr_b64=None):
+    """Score the extracted tests and collect the template variables."""
+    return dict(
+        patient_name=info["patient_name"],
+        patient_age_gender=info["age_gender"],
+        treatment_id=info["treatment_id"],
+        doctor_name=info["doctor"],
+        report_date=info.get("date", datetime.now().strftime("%d-%m-%Y")),
+        full_results=full_results,
+        logo_b64=logo_b64,
+        footer_qr=footer_qr_b64,
+        **score_results(full_results)
+    )
+
+def render_summary_html(context):
+    return _TEMPLATE.render(**context)
+
+def render_summary_pdf(html_out, summary_pdf_path, config):
+    """Render the summary HTML to PDF with wkhtmltopdf."""
+    pdfkit.from_string(html_out, summary_pdf_path, configuration=config, options=PDFKIT_OPTIONS)
+    return summary_pdf_path
+
+def render_summary_native(context):
+    """Draw the summary page without HTML or wkhtmltopdf; returns PDF bytes."""
+    try:
+        from summary_pdf import draw_summary_pdf
+    except ImportError as e:
+        raise RuntimeError(f"Native renderer unavailable ({e}). Run: pip install fpdf2")
+    return draw_summary_pdf(context)
+
+def merge_report(summary_pdf, original_pdf_path, output_path):
+    """
+    Write the summary page(s) followed by the original report.
+    summary_pdf may be a path or a file object (e.g. BytesIO from the native renderer).
+    """
+    merger = PdfWriter()
+    merger.append(summary_pdf)
+    merger.append(original_pdf_path)
+    merger.write(output_path)
+    merger.close()
+    return output_path
+
+def process_report(pdf_path, output_path, csv_path=None, config=None, logo_b64=None, footer_qr_b64=None,
+                   renderer=None, on_stage=None, engine="wkhtmltopdf", profile=None, pool=None):
+    """
+    Full single-report path: extract -> render -> merge.
+    Returns the extracted patient info. Raises on extract/render/merge failure.
+
+    engine   : one of SUMMARY_ENGINES.
+    renderer : callable(html_out, summary_pdf_path, config) used instead of
+               wkhtmltopdf (e.g. a stub when load testing extraction). Must
+               be picklable (module-level) when `pool` is given.
+    on_stage : callable(stage_name) returning a context manager that wraps the
+               "extract", "render" and "merge" steps (timing...).
+    profile  : True/False forces CPU profiling of this report; None defers to
+               MEESHA_PROFILE (see report_profiling). A ReportProfiler is used
+               as is and left for the caller to finish().
+    pool     : report_worker.WorkerPool to run extract and render in (what
+               app.main does); None runs every stage in this process.
+    """
+    if engine not in SUMMARY_ENGINES: raise ValueError(f"Unknown summary engine: {engine}")
+    if csv_path is None: csv_path = os.path.join(SCRIPT_DIR, CSV_DB_FILENAME)
+    if renderer is None and engine == "wkhtmltopdf":
+        if config is None: config = get_wkhtmltopdf_config()
+        if config is None: raise RuntimeError("'wkhtmltopdf' not found.")
+    if on_stage is None: on_stage = lambda name: nullcontext()
+
+    owns_profiler = not isinstance(profile, ReportProfiler)
+    if not owns_profiler: profiler = profile
+    else: profiler = ReportProfiler(report_hash(pdf_path)) if should_profile(profile) else None
+
+    def stage(name):
+        # In-process stages are profiled here, pool stages inside the worker (remote)
+        ctx = ExitStack()
+        ctx.enter_context(on_stage(name))
+        if profiler is not None and (pool is None or name == "merge"):
+            ctx.enter_context(profiler.stage(name))
+        return ctx
+    remote = lambda name: profiler.remote(name) if profiler is not None else None
+
+    summary_pdf_path = os.path.splitext(output_path)[0] + "_summary.pdf"
+    try:
+        with stage("extract"):
+            if pool is None:
+                info, full_results = extract_comprehensive_data(pdf_path, csv_path)
+            else:
+                info, full_results = pool.extract(pdf_path, csv_path, profile=remote("extract"))
+            if not info: raise RuntimeError("Could not read PDF")
+
+        with stage("render"):
+            context = build_summary_context(info, full_results, logo_b64, footer_qr_b64)
+            if engine == "native":
+                pdf_bytes = render_summary_native(context) if pool is None else \
+                    pool.render_native(context, profile=remote("render"))
+                summary = io.BytesIO(pdf_bytes)
+            elif pool is None:
+                (renderer or render_summary_pdf)(render_summary_html(context), summary_pdf_path, config)
+                summary = summary_pdf_path
+            else:
+                summary = pool.render(context, summary_pdf_path, profile=remote("render"), renderer=renderer)
+
+        with stage("merge"):
+            merge_report(summary, pdf_path, output_path)
+    finally:
+        if os.path.exists(summary_pdf_path): os.remove(summary_pdf_path)
+        if profiler is not None and owns_profiler: profiler.finish()
+    return info
@@ -0,0 +1,200 @@
+"""
+On-demand profiling for individual reports.
+A profiled report gets two files in MEESHA_PROFILE_DIR (default ./profiles),
+both tagged with the report hash:
+
+  <hash>_<time>.prof       cProfile dump: python -m pstats / snakeviz
+  <hash>_<time>.collapsed  sampled stacks, one "stage;frame;frame count" per
+                           line: flamegraph.pl / speedscope
+
+Profiling is opt-in per report: a per-request flag, or MEESHA_PROFILE
+("1" = every report, "N" = one report in N). When it is off nothing is
+wrapped, so the normal path pays nothing.
+
+Stages that run in report_worker processes are profiled there (run_profiled)
+and written as fragments; finish() merges them into the two files above.
+
+Profiling is best effort: if it can't start or write, the report still runs
+and a warning is logged. On Python 3.12+ only one cProfile can be active per
+process, so an in-process stage (merge in the app and daemon, everything in
+loadtest --mode thread) that overlaps another keeps only its sampled stacks.
+cProfile on 3.12+ also sees every thread, so an in-process .prof can include
+other reports' work; the .collapsed stacks are always the stage's own thread.
+"""
+import os
+import sys
+import glob
+import time
+import pstats
+import cProfile
+import threading
+import logging
+import itertools
+from collections import Counter
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.environ.get("MEESHA_PROFILE_DIR") or \
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+SAMPLE_INTERVAL = 0.005
+
+_counter = itertools.count(1)
+_counter_lock = threading.Lock()
+
+# ==============================
+#  1. POLICY
+# ==============================
+def should_profile(requested=None, every=None):
+    """
+    requested : per-request flag; True/False wins over everything else.
+    every     : profile one report in `every`; defaults to MEESHA_PROFILE.
+    """
+    if requested is not None: return bool(requested)
+    if every is None:
+        try:
+            every = int(os.environ.get("MEESHA_PROFILE", "0"))
+        except ValueError:
+            return False
+    if every <= 0: return False
+    if every == 1: return True
+    with _counter_lock:
+        return next(_counter) % every == 0
+
+# ==============================
+#  2. CAPTURE
+# ==============================
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class _StackSampler(threading.Thread):
+    """Samples one thread's stack at a fixed interval into collapsed-stack counts."""
+
+    def __init__(self, target_ident, root):
+        super().__init__(daemon=True)
+        self.target_ident = target_ident
+        self.root = root
+        self.counts = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(self.target_ident)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join([self.root] + stack[::-1])] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+def _start_capture(base, stage):
+    """Start the sampler and cProfile; either may come back None."""
+    sampler = profiler = None
+    try:
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        sampler = _StackSampler(threading.get_ident(), stage)
+        sampler.start()
+        profiler = cProfile.Profile()
+        profiler.enable()
+    except ValueError as e:
+        # 3.12+: "Another profiling tool is already active" (an overlapping stage)
+        logger.warning(f"{os.path.basename(base)}: {e}; keeping sampled stacks only")
+        profiler = None
+    except Exception as e:
+        logger.warning(f"{os.path.basename(base)}: could not start profiling: {e}")
+        if sampler is not None and sampler.is_alive(): sampler.stop()
+        sampler = profiler = None
+    return sampler, profiler
+
+def _stop_capture(base, sampler, profiler):
+    """Stop both and write whatever was captured as fragments."""
+    try:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(base + ".prof")
+        if sampler is not None:
+            sampler.stop()
+            with open(base + ".collapsed", "w") as f:
+                for stack, n in sampler.counts.items():
+                    f.write(f"{stack} {n}\n")
+    except Exception as e:
+        logger.warning(f"{os.path.basename(base)}: could not write profile: {e}")
+
+@contextmanager
+def profile_stage(tag, stage, out_dir=None):
+    """
+    Profile the enclosed block and write <tag>.<stage>.prof / .collapsed fragments.
+    Profiler errors are logged, never raised; the block's own errors pass through.
+    """
+    base = os.path.join(out_dir or PROFILE_DIR, f"{tag}.{stage}")
+    sampler, profiler = _start_capture(base, stage)
+    try:
+        yield
+    finally:
+        _stop_capture(base, sampler, profiler)
+
+def run_profiled(spec, fn, args=(), kwargs=None):
+    """Worker-side wrapper: spec comes from ReportProfiler.remote()."""
+    tag, stage, out_dir = spec
+    with profile_stage(tag, stage, out_dir):
+        return fn(*args, **(kwargs or {}))
+
+class ReportProfiler:
+    """Collects the stages of one report and merges them into a single profile."""
+
+    def __init__(self, report_hash, out_dir=None):
+        self.out_dir = out_dir or PROFILE_DIR
+        now = time.time()
+        self.tag = f"{report_hash}_{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}-{int(now * 1000) % 1000:03d}"
+
+    def stage(self, name):
+        """Profile an in-process stage."""
+        return profile_stage(self.tag, name, self.out_dir)
+
+    def remote(self, name):
+        """Picklable spec for run_profiled in a worker process."""
+        return (self.tag, name, self.out_dir)
+
+    def finish(self):
+        """
+        Merge stage fragments; returns (prof_path, collapsed_path) or None.
+        prof_path is None when every stage fell back to sampled stacks only.
+        Never raises: a failed merge is logged and returns None.
+        """
+        try:
+            return self._merge_fragments()
+        except Exception as e:
+            logger.warning(f"Could not merge profile {self.tag}: {e}")
+            return None
+
+    def _merge_fragments(self):
+        base = os.path.join(self.out_dir, self.tag)
+        profs = sorted(glob.glob(glob.escape(base) + ".*.prof"))
+        collapsed = sorted(glob.glob(glob.escape(base) + ".*.collapsed"))
+        if not profs and not collapsed: return None
+
+        prof_path = None
+        if profs:
+            stats = pstats.Stats(profs[0])
+            for frag in profs[1:]:
+                stats.add(frag)
+            prof_path = base + ".prof"
+            stats.dump_stats(prof_path)
+
+        counts = Counter()
+        for frag in collapsed:
+            with open(frag) as f:
+                for line in f:
+                    stack, _, n = line.rstrip("\n").rpartition(" ")
+                    if stack: counts[stack] += int(n)
+        with open(base + ".collapsed", "w") as f:
+            for stack, n in counts.most_common():
+                f.write(f"{stack} {n}\n")
+        for frag in profs + collapsed:
+            os.remove(frag)
+        return prof_path, base + ".collapsed"
@@ -0,0 +1,282 @@
+"""
+Isolated report workers.
+Extraction (pdfplumber) and rendering (wkhtmltopdf) run in long-lived child
+processes so one pathological PDF can't stall the Streamlit process or the
+daemon. Each job gets a wall-clock timeout and an RSS ceiling; a worker that
+breaches either is killed (with its wkhtmltopdf child) and replaced, and
+workers are recycled after a fixed number of jobs to shed leaked memory.
+
+Failures come back as ReportWorkerError, never as a hung call.
+"""
+import os
+import time
+import queue
+import signal
+import logging
+import threading
+import multiprocessing
+
+from report_core import (
+    get_wkhtmltopdf_config, load_reference_db, extract_comprehensive_data, extract_raw_data,
+    render_summary_html, render_summary_pdf, render_summary_native,
+)
+from report_profiling import run_profiled
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EXTRACT_TIMEOUT = 120
+DEFAULT_RENDER_TIMEOUT = 60
+DEFAULT_MAX_RSS_MB = 1500
+DEFAULT_MAX_JOBS = 50
+# Leave a core for the Streamlit / daemon process itself
+DEFAULT_POOL_SIZE = max(1, min(4, (os.cpu_count() or 2) - 1))
+_POLL_INTERVAL = 0.2
+
+# ==============================
+#  1. ERRORS & HELPERS
+# ==============================
+class ReportWorkerError(Exception):
+    """
+    A report job that did not finish.
+    kind is one of "timeout", "memory", "crashed", "failed".
+    """
+
+    def __init__(self, kind, stage, message):
+        super().__init__(f"{stage} {kind}: {message}")
+        self.kind = kind
+        self.stage = stage
+        self.message = message
+
+    def to_dict(self):
+        return {"error": self.kind, "stage": self.stage, "message": self.message}
+
+def process_rss_bytes(pid):
+    """Resident memory of `pid` in bytes, or None if it can't be read here."""
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss
+    except ImportError:
+        pass
+    except Exception:
+        return None
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def _kill_tree(proc):
+    """Kill a worker and anything it spawned (wkhtmltopdf)."""
+    try:
+        import psutil
+        try:
+            for child in psutil.Process(proc.pid).children(recursive=True):
+                child.kill()
+        except psutil.Error:
+            pass
+        proc.kill()
+    except ImportError:
+        if hasattr(os, "killpg"):
+            try: os.killpg(proc.pid, signal.SIGKILL)
+            except OSError: proc.kill()
+        else:
+            proc.kill()
+    proc.join(5)
+
+# ==============================
+#  2. JOBS (run inside the worker)
+# ==============================
+def _render_job(context, summary_pdf_path, renderer=None):
+    config = None
+    if renderer is None:
+        config = get_wkhtmltopdf_config()
+        if config is None: raise RuntimeError("'wkhtmltopdf' not found.")
+        renderer = render_summary_pdf
+    renderer(render_summary_html(context), summary_pdf_path, config)
+    return summary_pdf_path
+
+def _extract_raw_job(pdf_path, csv_path):
+    df = load_reference_db(csv_path)
+    if df is None: raise RuntimeError(f"Could not load reference ranges from {csv_path}")
+    return extract_raw_data(pdf_path, df)
+
+def _cpu_seconds():
+    # children_* covers wkhtmltopdf once pdfkit has reaped it (always 0 on Windows)
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+def _worker_main(conn):
+    # Own process group, so a kill also takes out wkhtmltopdf
+    if hasattr(os, "setpgrp"): os.setpgrp()
+    # Ctrl+C reaches every process on the console (no process groups on Windows);
+    # the parent decides when workers stop, so in-flight jobs get to finish
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            break
+        if msg is None: break
+        fn, args, kwargs = msg
+        c0 = _cpu_seconds()
+        try:
+            result = fn(*args, **kwargs)
+            usage = {"cpu_s": _cpu_seconds() - c0, "rss_bytes": process_rss_bytes(os.getpid())}
+            conn.send(("ok", result, usage))
+        except MemoryError:
+            conn.send(("memory", "Ran out of memory", None))
+        except Exception as e:
+            conn.send(("failed", f"{type(e).__name__}: {e}", None))
+
+# ==============================
+#  3. WORKERS
+# ==============================
+class IsolatedWorker:
+    """One child process that runs jobs serially under a timeout and RSS limit."""
+
+    def __init__(self, max_rss_mb=DEFAULT_MAX_RSS_MB, max_jobs=DEFAULT_MAX_JOBS):
+        self.max_rss_bytes = max_rss_mb * 1024 * 1024 if max_rss_mb else None
+        self.max_jobs = max_jobs
+        # spawn, not fork: the parent is multi-threaded (Streamlit, daemon stages)
+        self._ctx = multiprocessing.get_context("spawn")
+        self._proc = None
+        self._conn = None
+        self.jobs = 0
+        self.last_usage = None  # {"cpu_s", "rss_bytes"} of the last finished job
+
+    def _spawn(self):
+        parent_conn, child_conn = self._ctx.Pipe()
+        self._proc = self._ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self._proc.start()
+        child_conn.close()
+        self._conn = parent_conn
+        self.jobs = 0
+
+    def _kill(self):
+        if self._proc is not None:
+            _kill_tree(self._proc)
+            self._conn.close()
+        self._proc = self._conn = None
+
+    def close(self):
+        """Ask the worker to exit, killing it if it doesn't."""
+        if self._proc is None: return
+        try:
+            self._conn.send(None)
+            self._proc.join(5)
+        except (OSError, ValueError):
+            pass
+        if self._proc.is_alive(): _kill_tree(self._proc)
+        self._conn.close()
+        self._proc = self._conn = None
+
+    def run(self, fn, args=(), kwargs=None, timeout=None, stage="job"):
+        if self._proc is None or not self._proc.is_alive():
+            self._kill()
+            self._spawn()
+        elif self.max_jobs and self.jobs >= self.max_jobs:
+            self.close()
+            self._spawn()
+
+        self.jobs += 1
+        self._conn.send((fn, args, kwargs or {}))
+        deadline = time.monotonic() + timeout if timeout else None
+
+        while not self._conn.poll(_POLL_INTERVAL):
+            if not self._proc.is_alive():
+                code = self._proc.exitcode
+                self._kill()
+                raise ReportWorkerError("crashed", stage, f"Worker exited with code {code}")
+            if self.max_rss_bytes:
+                rss = process_rss_bytes(self._proc.pid)
+                if rss is not None and rss > self.max_rss_bytes:
+                    self._kill()
+                    raise ReportWorkerError("memory", stage, f"Worker exceeded {self.max_rss_bytes // (1024 * 1024)} MB")
+            if deadline and time.monotonic() > deadline:
+                self._kill()
+                raise ReportWorkerError("timeout", stage, f"Gave up after {timeout}s")
+
+        try:
+            status, payload, self.last_usage = self._conn.recv()
+        except (EOFError, OSError):
+            self._proc.join(1)
+            code = self._proc.exitcode
+            self._kill()
+            raise ReportWorkerError("crashed", stage, f"Worker exited with code {code}")
+        if status != "ok":
+            if status == "memory": self._kill()
+            raise ReportWorkerError(status, stage, payload)
+        return payload
+
+class WorkerPool:
+    """
+    A fixed set of IsolatedWorkers shared by threads (Streamlit sessions,
+    daemon stages). Callers block while every worker is busy.
+    """
+
+    def __init__(self, size=DEFAULT_POOL_SIZE, extract_timeout=DEFAULT_EXTRACT_TIMEOUT, render_timeout=DEFAULT_RENDER_TIMEOUT,
+                 max_rss_mb=DEFAULT_MAX_RSS_MB, max_jobs=DEFAULT_MAX_JOBS):
+        self.extract_timeout = extract_timeout
+        self.render_timeout = render_timeout
+        self._workers = [IsolatedWorker(max_rss_mb, max_jobs) for _ in range(size)]
+        self._idle = queue.Queue()
+        for w in self._workers:
+            self._idle.put(w)
+        self._closed = threading.Event()
+        self._usage = threading.local()
+        if max_rss_mb and process_rss_bytes(os.getpid()) is None:
+            logger.warning(f"Can't read process memory here; the {max_rss_mb} MB worker limit is off. "
+                           "Install psutil (pip install -r requirements.txt).")
+
+    def run(self, fn, args=(), kwargs=None, timeout=None, stage="job"):
+        if self._closed.is_set(): raise RuntimeError("WorkerPool is closed")
+        worker = self._idle.get()
+        try:
+            result = worker.run(fn, args, kwargs, timeout, stage)
+            usage = worker.last_usage
+        finally:
+            self._idle.put(worker)
+        totals = self.thread_usage()
+        totals["jobs"] += 1
+        totals["cpu_s"] += usage["cpu_s"]
+        totals["rss_bytes"] = usage["rss_bytes"]
+        self._usage.totals = totals
+        return result
+
+    def thread_usage(self):
+        """
+        Running totals for jobs the calling thread ran through this pool:
+        {"jobs", "cpu_s" (worker CPU, wkhtmltopdf included where the OS
+        reports it), "rss_bytes" (worker RSS after the latest job)}.
+        """
+        return dict(getattr(self._usage, "totals", {"jobs": 0, "cpu_s": 0.0, "rss_bytes": None}))
+
+    def _call(self, fn, args, timeout, stage, profile):
+        # profile: a ReportProfiler.remote() spec, or None to run unwrapped
+        if profile is not None: fn, args = run_profiled, (profile, fn, args)
+        return self.run(fn, args, timeout=timeout, stage=stage)
+
+    def extract(self, pdf_path, csv_path, profile=None):
+        """Isolated extract_comprehensive_data -> (info, full_results)."""
+        return self._call(extract_comprehensive_data, (pdf_path, csv_path), self.extract_timeout, "extract", profile)
+
+    def extract_raw(self, pdf_path, csv_path, profile=None):
+        """Isolated extract_raw_data -> (info, raw_values), no ranges applied."""
+        return self._call(_extract_raw_job, (pdf_path, csv_path), self.extract_timeout, "extract", profile)
+
+    def render(self, context, summary_pdf_path, profile=None, renderer=None):
+        """
+        Isolated HTML render + wkhtmltopdf for a build_summary_context() result.
+        renderer: picklable callable(html_out, summary_pdf_path, config) to use instead.
+        """
+        return self._call(_render_job, (context, summary_pdf_path, renderer), self.render_timeout, "render", profile)
+
+    def render_native(self, context, profile=None):
+        """Isolated render_summary_native -> PDF bytes (no temp file, no wkhtmltopdf)."""
+        return self._call(render_summary_native, (context,), self.render_timeout, "render", profile)
+
+    def close(self):
+        """Stop taking jobs and shut every worker down once it is idle."""
+        self._closed.set()
+        for _ in self._workers:
+            self._idle.get().close()
@@ -0,0 +1,105 @@
+"""
+Meesha Re-score
+Re-applies reference ranges to the raw extraction archive (extraction_store)
+without parsing PDFs again.
+
+  ingest : parse PDFs once and store their raw values (skips known reports)
+  apply  : re-evaluate every stored report against a (new) reference CSV.
+           Only tests whose applied range changed get a new status; score and
+           narrative are rebuilt only for reports with at least one change.
+
+A test that is new in the CSV was never looked for in the stored raw values;
+picking it up still needs `ingest --force` on the original PDFs.
+
+Usage:
+    python rescore.py ingest "D:\\LIS\\Archive"
+    python rescore.py apply --csv test_and_values.csv --dry-run
+"""
+import os
+import logging
+import argparse
+
+from report_core import (
+    SCRIPT_DIR, CSV_DB_FILENAME,
+    load_reference_db, index_reference_db, extract_raw_data, report_hash,
+)
+from extraction_store import STORE_DIR, build_record, rescore_record, save_record, load_record, iter_records
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def _pdf_paths(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.lower().endswith(".pdf"): yield os.path.join(root, name)
+        elif path.lower().endswith(".pdf"):
+            yield path
+
+def ingest(paths, csv_path, store_dir=None, force=False):
+    df = load_reference_db(csv_path)
+    if df is None: raise RuntimeError(f"Could not load {csv_path}")
+    refs = index_reference_db(df)
+
+    stored = skipped = 0
+    for pdf_path in _pdf_paths(paths):
+        h = report_hash(pdf_path)
+        if not force and load_record(h, store_dir) is not None:
+            skipped += 1
+            continue
+        info, raw_values = extract_raw_data(pdf_path, df)
+        if not info:
+            logger.warning(f"Could not read {pdf_path}")
+            continue
+        save_record(build_record(h, os.path.basename(pdf_path), info, raw_values, refs), store_dir)
+        stored += 1
+    logger.info(f"Ingested {stored} report(s), {skipped} already stored")
+    return stored
+
+def apply(csv_path, store_dir=None, dry_run=False):
+    df = load_reference_db(csv_path)
+    if df is None: raise RuntimeError(f"Could not load {csv_path}")
+    refs = index_reference_db(df)
+
+    scanned = changed_reports = changed_tests = 0
+    for record in iter_records(store_dir):
+        scanned += 1
+        old_summary = record["summary"]
+        old_status = {r["name"]: r["status"] for r in record["results"]}
+        changed = rescore_record(record, refs)
+        if not changed: continue
+
+        changed_reports += 1
+        changed_tests += len(changed)
+        new_status = {r["name"]: r["status"] for r in record["results"]}
+        flips = [f"{n}: {old_status.get(n, '-')} -> {new_status.get(n, 'dropped')}" for n in changed]
+        logger.info(f"{record['report_hash']} ({record['source']}): score "
+                    f"{old_summary['overall_score']} -> {record['summary']['overall_score']}; " + "; ".join(flips))
+        if not dry_run: save_record(record, store_dir)
+
+    logger.info(f"{scanned} report(s) scanned, {changed_reports} re-scored, {changed_tests} test(s) re-derived"
+                + (" (dry run, nothing written)" if dry_run else ""))
+    return changed_reports
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score stored extractions against updated reference ranges.")
+    parser.add_argument("--store", default=STORE_DIR, help="Extraction archive folder")
+    parser.add_argument("--csv", default=os.path.join(SCRIPT_DIR, CSV_DB_FILENAME), help="Reference ranges CSV")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_ingest = sub.add_parser("ingest", help="Parse PDFs into the archive")
+    p_ingest.add_argument("paths", nargs="+", help="PDF files or folders")
+    p_ingest.add_argument("--force", action="store_true", help="Re-parse reports already stored")
+
+    p_apply = sub.add_parser("apply", help="Re-apply the CSV to every stored report")
+    p_apply.add_argument("--dry-run", action="store_true", help="Report changes without writing them")
+
+    args = parser.parse_args()
+    if args.command == "ingest":
+        ingest(args.paths, args.csv, args.store, args.force)
+    else:
+        apply(args.csv, args.store, args.dry_run)
+
+if __name__ == "__main__":
+    main()
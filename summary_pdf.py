@@ -0,0 +1,295 @@
+"""
+Native summary-page renderer.
+Draws the same layout as report_core.HTML_TEMPLATE (header, patient box,
+four stat cells, narrative, results table, footer) straight into a PDF with
+fpdf2, so no HTML engine or wkhtmltopdf binary is involved. Takes the
+context dict from build_summary_context() and returns PDF bytes ready to
+hand to PdfWriter.
+"""
+import io
+import re
+import base64
+from fpdf import FPDF
+
+# Palette shared with HTML_TEMPLATE
+TEAL = (15, 118, 110)
+TEAL_LIGHT = (45, 212, 191)
+INK = (15, 23, 42)
+SLATE = (51, 65, 85)
+MUTED = (100, 116, 139)
+FAINT = (148, 163, 184)
+BORDER = (226, 232, 240)
+ROW_ALT = (248, 250, 252)
+BADGES = {
+    "crit": ("CRITICAL", (254, 226, 226), (153, 27, 27)),
+    "warn": ("ABNORMAL", (255, 251, 235), (180, 83, 9)),
+    "norm": ("NORMAL", (220, 252, 231), (21, 128, 61)),
+}
+
+MARGIN = 15
+PAGE_W = 210
+CONTENT_W = PAGE_W - 2 * MARGIN
+PATIENT_COL_W = (CONTENT_W - 6) / 4
+TABLE_WIDTHS = (CONTENT_W * 0.4, CONTENT_W * 0.3, CONTENT_W * 0.3)
+
+# ==============================
+#  1. HELPERS
+# ==============================
+def _txt(value):
+    """Core PDF fonts are latin-1 only; drop what they can't draw."""
+    return str(value).encode("latin-1", "ignore").decode("latin-1")
+
+def _cell_txt(value):
+    """Table-cell text: whitespace collapsed the way HTML renders it."""
+    return _txt(" ".join(str(value).split()))
+
+def _line_count(pdf, w, h, text):
+    """Lines `text` wraps to at width `w` in the current font."""
+    return max(1, len(pdf.multi_cell(w, h, text, dry_run=True, output="LINES")))
+
+def _narrative_markdown(html):
+    """The narrative is a small HTML fragment; keep <b> as fpdf2 markdown."""
+    text = re.sub(r"</?b>", "**", html, flags=re.IGNORECASE)
+    return _txt(re.sub(r"<[^>]+>", "", text))
+
+def _badge_kind(status):
+    if "Crit" in status: return "crit"
+    if "Normal" in status: return "norm"
+    return "warn"
+
+def _image(pdf, b64, x, y, h):
+    if not b64: return 0
+    try:
+        info = pdf.image(io.BytesIO(base64.b64decode(b64)), x=x, y=y, h=h)
+        return info.rendered_width
+    except Exception:
+        return 0
+
+class _SummaryPDF(FPDF):
+    def font(self, size, style="", color=SLATE, family="helvetica"):
+        self.set_font(family, style, size)
+        self.set_text_color(*color)
+
+# ==============================
+#  2. SECTIONS
+# ==============================
+def _header(pdf, ctx):
+    top = pdf.get_y()
+    x = MARGIN + _image(pdf, ctx.get("logo_b64"), MARGIN, top, 13)
+    if x > MARGIN: x += 4
+
+    pdf.set_xy(x, top + 2)
+    pdf.font(15, "B", TEAL)
+    pdf.cell(0, 6, "MEESHA DIAGNOSTICS")
+    pdf.set_xy(x, top + 8)
+    pdf.font(7.5, "", MUTED)
+    pdf.cell(0, 4, "AI Clinical Analysis Report")
+
+    pdf.font(7, "", SLATE)
+    for i, (lbl, val) in enumerate((("DATE:", ctx["report_date"]), ("ID:", ctx["treatment_id"]))):
+        pdf.set_xy(MARGIN, top + 3 + i * 4)
+        pdf.cell(CONTENT_W, 4, _txt(f"**{lbl}** {val}"), align="R", markdown=True)
+
+    y = top + 16
+    pdf.set_draw_color(*TEAL)
+    pdf.set_line_width(0.6)
+    pdf.line(MARGIN, y, MARGIN + CONTENT_W, y)
+    pdf.set_y(y + 6)
+
+def _patient_box(pdf, ctx):
+    cols = [
+        ("PATIENT NAME", _cell_txt(ctx["patient_name"])),
+        ("AGE / GENDER", _cell_txt(ctx["patient_age_gender"])),
+        ("REFERRED BY", _cell_txt(ctx["doctor_name"])),
+        ("LAB ID", _cell_txt(ctx["treatment_id"])),
+    ]
+    val_w, line_h = PATIENT_COL_W - 3, 4
+    # Values wrap inside their column like the HTML table cells; the box grows to fit
+    pdf.font(8.5, "B", INK)
+    lines = max(_line_count(pdf, val_w, line_h, val) for _, val in cols)
+    top, h = pdf.get_y(), 9 + line_h * lines
+    pdf.set_fill_color(*ROW_ALT)
+    pdf.set_draw_color(*BORDER)
+    pdf.set_line_width(0.2)
+    pdf.rect(MARGIN, top, CONTENT_W, h, style="DF")
+    pdf.set_fill_color(*TEAL)
+    pdf.rect(MARGIN, top, 1.2, h, style="F")
+
+    for i, (lbl, val) in enumerate(cols):
+        x = MARGIN + 4 + i * PATIENT_COL_W
+        align = "R" if i == 3 else "L"
+        pdf.set_xy(x, top + 2.5)
+        pdf.font(6, "B", MUTED)
+        pdf.cell(val_w, 3, lbl, align=align)
+        pdf.set_xy(x, top + 6.5)
+        pdf.font(8.5, "B", INK)
+        pdf.multi_cell(val_w, line_h, val, align=align)
+    pdf.set_y(top + h + 6)
+
+def _stat_cells(pdf, ctx):
+    top, h, gap = pdf.get_y(), 20, 3.5
+    cell_w = (CONTENT_W - 3 * gap) / 4
+    cells = [
+        (f"{ctx['overall_score']}/10", "HEALTH SCORE", TEAL_LIGHT),
+        (ctx["count_normal"], "NORMAL", BADGES["norm"][2]),
+        (ctx["count_warn"], "WARNING", BADGES["warn"][2]),
+        (ctx["count_crit"], "CRITICAL", BADGES["crit"][2]),
+    ]
+    pdf.set_line_width(0.2)
+    for i, (val, lbl, color) in enumerate(cells):
+        x = MARGIN + i * (cell_w + gap)
+        if i == 0:
+            pdf.set_fill_color(*INK)
+            pdf.rect(x, top, cell_w, h, style="F", round_corners=True, corner_radius=2)
+        else:
+            pdf.set_draw_color(*BORDER)
+            pdf.rect(x, top, cell_w, h, style="D", round_corners=True, corner_radius=2)
+
+        pdf.set_xy(x, top + (2 if i == 0 else 4))
+        pdf.font(14, "B", color)
+        pdf.cell(cell_w, 7, _txt(val), align="C")
+        pdf.set_xy(x, top + (9 if i == 0 else 12))
+        pdf.font(6.5, "B", FAINT if i == 0 else MUTED)
+        pdf.cell(cell_w, 3.5, lbl, align="C")
+
+        if i == 0:
+            tag = _txt(ctx["risk_label"]).upper()
+            pdf.font(6, "B", INK)
+            tag_w = pdf.get_string_width(tag) + 4
+            pdf.set_fill_color(*TEAL_LIGHT)
+            pdf.rect(x + (cell_w - tag_w) / 2, top + 13.5, tag_w, 4, style="F", round_corners=True, corner_radius=1)
+            pdf.set_xy(x, top + 13.5)
+            pdf.cell(cell_w, 4, tag, align="C")
+    pdf.set_y(top + h + 6)
+
+def _section_title(pdf, title):
+    pdf.font(9, "B", TEAL)
+    pdf.cell(0, 5, title, new_x="LMARGIN", new_y="NEXT")
+    y = pdf.get_y() + 0.5
+    pdf.set_draw_color(209, 250, 229)
+    pdf.set_line_width(0.3)
+    pdf.line(pdf.get_x(), y, pdf.get_x() + pdf.epw, y)
+    pdf.set_y(y + 2)
+
+def _narrative(pdf, ctx):
+    # Measure first so the box can be drawn behind the text
+    pdf.font(9, "", SLATE)
+    text = _narrative_markdown(ctx["narrative"])
+    lines = pdf.multi_cell(CONTENT_W - 10, 5, text, markdown=True, dry_run=True, output="LINES")
+    top, h = pdf.get_y(), 14 + 5 * len(lines)
+
+    pdf.set_fill_color(240, 253, 250)
+    pdf.set_draw_color(204, 251, 241)
+    pdf.set_line_width(0.2)
+    pdf.rect(MARGIN, top, CONTENT_W, h, style="DF", round_corners=True, corner_radius=2)
+
+    pdf.set_left_margin(MARGIN + 5)
+    pdf.set_right_margin(MARGIN + 5)
+    pdf.set_xy(MARGIN + 5, top + 4)
+    _section_title(pdf, "AI EXECUTIVE SUMMARY")
+    pdf.font(9, "", SLATE)
+    pdf.multi_cell(CONTENT_W - 10, 5, text, markdown=True, align="J")
+    pdf.set_left_margin(MARGIN)
+    pdf.set_right_margin(MARGIN)
+    pdf.set_y(top + h + 6)
+
+def _results_table(pdf, ctx):
+    widths = TABLE_WIDTHS
+    min_row_h, head_h, name_h, val_h, ref_h = 10, 7, 4, 4, 3
+
+    def table_head():
+        pdf.set_fill_color(*TEAL)
+        pdf.font(6.5, "B", (255, 255, 255))
+        for w, label in zip(widths, ("TEST NAME", "RESULT / RANGE", "ANALYSIS")):
+            pdf.cell(w, head_h, "  " + label, fill=True)
+        pdf.ln(head_h)
+
+    _section_title(pdf, "BIOMARKER ANALYSIS")
+    table_head()
+    pdf.set_draw_color(*BORDER)
+    pdf.set_line_width(0.2)
+    for i, test in enumerate(ctx["full_results"]):
+        name, value, ref = _cell_txt(test["name"]), _cell_txt(test["value"]), _cell_txt(f"Ref: {test['range']}")
+
+        # Size the row from the wrapped text before deciding whether it fits on this page
+        pdf.font(8, "B", INK)
+        name_lines = _line_count(pdf, widths[0] - 3, name_h, name)
+        val_lines = _line_count(pdf, widths[1] - 3, val_h, value)
+        pdf.font(6, "", FAINT)
+        ref_lines = _line_count(pdf, widths[1] - 3, ref_h, ref)
+        result_h = val_h * val_lines + 0.8 + ref_h * ref_lines
+        row_h = max(min_row_h, name_h * name_lines + 3, result_h + 3)
+
+        if pdf.get_y() + row_h > pdf.page_break_trigger:
+            pdf.add_page()
+            table_head()
+        y = pdf.get_y()
+        if i % 2: pdf.set_fill_color(*ROW_ALT); pdf.rect(MARGIN, y, CONTENT_W, row_h, style="F")
+        pdf.line(MARGIN, y + row_h, MARGIN + CONTENT_W, y + row_h)
+
+        pdf.set_xy(MARGIN + 2.5, y + (row_h - name_h * name_lines) / 2)
+        pdf.font(8, "B", INK)
+        pdf.multi_cell(widths[0] - 3, name_h, name, align="L")
+
+        x = MARGIN + widths[0] + 2.5
+        ry = y + (row_h - result_h) / 2
+        pdf.set_xy(x, ry)
+        pdf.font(8, "B", INK)
+        pdf.multi_cell(widths[1] - 3, val_h, value, align="L")
+        pdf.set_xy(x, ry + val_h * val_lines + 0.8)
+        pdf.font(6, "", FAINT)
+        pdf.multi_cell(widths[1] - 3, ref_h, ref, align="L")
+
+        label, bg, fg = BADGES[_badge_kind(test["status"])]
+        bx = MARGIN + widths[0] + widths[1] + 2.5
+        by = y + (row_h - 4.4) / 2
+        pdf.set_fill_color(*bg)
+        pdf.rect(bx, by, 22, 4.4, style="F", round_corners=True, corner_radius=1)
+        pdf.set_xy(bx, by)
+        pdf.font(6, "B", fg)
+        pdf.cell(22, 4.4, label, align="C")
+        pdf.set_y(y + row_h)
+    pdf.ln(6)
+
+def _footer(pdf, ctx):
+    h = 22
+    if pdf.get_y() + h > pdf.page_break_trigger: pdf.add_page()
+    top = pdf.get_y() + 4
+    pdf.set_draw_color(203, 213, 225)
+    pdf.set_line_width(0.2)
+    pdf.line(MARGIN, top, MARGIN + CONTENT_W, top)
+
+    pdf.font(7, "", MUTED)
+    pdf.set_xy(MARGIN, top + h - 9)
+    pdf.multi_cell(CONTENT_W * 0.6, 3.5,
+                   "**Mahalaxmi Branch:** 1st Floor, La View, B.J. Marg, Jacob Circle\n"
+                   "**BKC Centre:** 310, Trade Center, BKC, Mumbai", markdown=True)
+
+    right = MARGIN + CONTENT_W
+    qr_w = _image(pdf, ctx.get("footer_qr"), right - 12, top + 2, 12)
+    sig_y = top + (15 if qr_w else 8)
+    pdf.set_xy(MARGIN, sig_y)
+    pdf.font(11, "B", INK, family="times")
+    pdf.cell(CONTENT_W, 4.5, "Dr. Sudha TR", align="R")
+    pdf.set_xy(MARGIN, sig_y + 4.5)
+    pdf.font(6, "B", TEAL)
+    pdf.cell(CONTENT_W, 3, "CONSULTANT PATHOLOGIST", align="R")
+
+# ==============================
+#  3. ENTRY POINT
+# ==============================
+def draw_summary_pdf(context):
+    """Draw the summary page(s) for a build_summary_context() dict; return PDF bytes."""
+    pdf = _SummaryPDF(format="A4", unit="mm")
+    pdf.set_margins(MARGIN, MARGIN, MARGIN)
+    pdf.set_auto_page_break(True, margin=MARGIN)
+    pdf.set_title("Meesha Health Analysis")
+    pdf.add_page()
+
+    _header(pdf, context)
+    _patient_box(pdf, context)
+    _stat_cells(pdf, context)
+    _narrative(pdf, context)
+    _results_table(pdf, context)
+    _footer(pdf, context)
+    return bytes(pdf.output())